@@ -0,0 +1,224 @@
+import atexit
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, event, insert, select, update
+
+from models import ActivityDailyCount, ActivityLog, Users, db, increment_upsert
+
+logger = logging.getLogger(__name__)
+
+# Column widths of activity_log.action_type / contact_name; contact names may be twice as long
+MAX_ACTION_TYPE_LENGTH = ActivityLog.action_type.type.length
+MAX_CONTACT_NAME_LENGTH = ActivityLog.contact_name.type.length
+
+
+class ActivityWriter:
+    # Collects ActivityLog entries written by the routes.
+    #
+    # 'sync' inserts them in the request's own transaction (used by tests). 'async' holds them on
+    # the session until it commits, then hands them to a background thread that writes them in
+    # multi-row batches, so the audit insert is no longer part of request latency.
+
+    def __init__(self, app=None, mode='async', queue_size=10000, flush_size=500, flush_interval=1.0, put_timeout=0.5):
+        self.app = None
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.overflowed = 0
+        self.failed = 0
+        # Called with every recorded batch, e.g. to push the entries to live event streams
+        self.listeners = []
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if self.mode == 'async' and not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+            atexit.register(self.stop)
+
+    def record(self, user_id, action, action_type, contact_name):
+        self.record_many([{
+            'user_id': user_id,
+            'timestamp': datetime.datetime.utcnow(),
+            'action': action,
+            'action_type': action_type,
+            'contact_name': contact_name
+        }])
+
+    def record_many(self, entries):
+        if not entries:
+            return
+        entries = [dict(entry, action_type=(entry['action_type'] or '')[:MAX_ACTION_TYPE_LENGTH],
+                        contact_name=(entry['contact_name'] or '')[:MAX_CONTACT_NAME_LENGTH]) for entry in entries]
+        for listener in self.listeners:
+            listener(entries)
+        if self.mode == 'sync':
+            db.session.execute(insert(ActivityLog), entries)
+            db.session.execute(*rollup_upsert(entries))
+        else:
+            # Only enqueued once the surrounding transaction commits, so rolled back changes leave no trace
+            db.session.info.setdefault('pending_activities', []).extend(entries)
+
+    def _after_commit(self, session):
+        entries = session.info.pop('pending_activities', None)
+        if not entries:
+            return
+        self._ensure_started()
+        for position, entry in enumerate(entries):
+            try:
+                self.queue.put(entry, timeout=self.put_timeout)
+            except queue.Full:
+                # Backpressure: the producer has waited put_timeout already, so write the rest inline
+                with self.lock:
+                    self.overflowed += len(entries) - position
+                self._write(entries[position:])
+                return
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop('pending_activities', None)
+
+    def _ensure_started(self):
+        # Started lazily so each forked gunicorn worker gets its own flusher thread
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+                self.stopping.clear()
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        # A batch mixes users, so one bad entry must not take the others down with it: after a
+        # retry (for transient errors) the batch is written row by row and only bad rows are dropped
+        for attempt in range(2):
+            try:
+                self._insert(batch)
+                with self.lock:
+                    self.written += len(batch)
+                return
+            except Exception:
+                logger.warning('Failed to write %d activity log entries (attempt %d)', len(batch), attempt + 1,
+                               exc_info=True)
+        for entry in batch:
+            try:
+                self._insert([entry])
+                with self.lock:
+                    self.written += 1
+            except Exception:
+                with self.lock:
+                    self.failed += 1
+                logger.exception('Dropped activity log entry %r', entry)
+
+    def _insert(self, batch):
+        with self.app.app_context(), db.engine.begin() as connection:
+            connection.execute(insert(ActivityLog.__table__), batch)
+            connection.execute(*rollup_upsert(batch))
+            # The activity feed changed, so cached reads for these users are stale
+            connection.execute(bump_data_versions({entry['user_id'] for entry in batch}))
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.flush_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stop(self, timeout=5.0):
+        # Called on worker shutdown: stop the flusher, then drain whatever is still queued
+        self.stopping.set()
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            self.thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'mode': self.mode,
+                'queued': self.queue.qsize(),
+                'written': self.written,
+                'overflowed': self.overflowed,
+                'failed': self.failed,
+            }
+
+
+def rollup_upsert(entries):
+    # Aggregates entries per (user, day, action) and adds them onto activity_daily_counts.
+    # Rows are sorted so concurrent flushes take the row locks in the same order.
+    counts = Counter((uuid.UUID(str(entry['user_id'])), entry['timestamp'].date(), entry['action']) for entry in entries)
+    rows = [
+        {'user_id': user_id, 'day': day, 'action': action, 'total': total}
+        for (user_id, day, action), total in sorted(counts.items())
+    ]
+    return increment_upsert(ActivityDailyCount.__table__, ['user_id', 'day', 'action'], 'total'), rows
+
+
+def prune_activities(cutoff, batch_size=1000, pause=0.1):
+    # Deletes activity rows older than cutoff a bounded batch at a time, committing between batches
+    # so no single statement holds locks on a large part of the table
+    deleted = 0
+    while True:
+        rows = db.session.execute(
+            select(ActivityLog.id, ActivityLog.user_id).where(ActivityLog.timestamp < cutoff).limit(batch_size)
+        ).all()
+        if rows:
+            db.session.execute(delete(ActivityLog).where(ActivityLog.id.in_([row.id for row in rows])),
+                               execution_options={'synchronize_session': False})
+            # Cached and 304'd activity feeds of these users must not keep showing the pruned rows
+            db.session.execute(bump_data_versions({row.user_id for row in rows}))
+        db.session.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def bump_data_versions(user_ids):
+    return update(Users.__table__).where(Users.id.in_(user_ids)) \
+        .values(data_version=Users.data_version + 1, data_updated_at=datetime.datetime.utcnow())
@@ -1,47 +1,334 @@
-from flask import Flask, request, jsonify
-from flask_dance.contrib.google import make_google_blueprint
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, make_response, stream_with_context
+from flask.cli import with_appcontext
 from flask_cors import CORS
-from flask_migrate import Migrate
 import os
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
-from models import Users, Contacts, db, ActivityLog
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity, JWTManager
+from models import CONTACT_FIELDS, BINNED_CONTACT, LIVE_CONTACT, Users, Contacts, ContactTombstone, db, ActivityLog, ActivityDailyCount, password_hasher
+from passwords import PasswordHasherBusy
+import contact_stats
+from categories import MAX_CATEGORY_LENGTH, category_filter, renamed_categories, validate_categories
+from contact_keys import canonical_email, canonical_phone, normalized_values
+import search
+from revocation import create_revocation_store
+from metrics import RequestMetrics
+from duplicates import find_duplicate_groups, merged_fields
+from activity_log import ActivityWriter, prune_activities
+from cache import create_cache
+from events import TooManyStreams, create_event_bus
+from contact_io import EXPORT_FORMATS, FORMATS, VALID_STATUSES, RowError, detect_format, read_rows, validate_row, write_rows
+from pagination import InvalidCursor, decode_cursor, encode_cursor, page_size, parse_bool, parse_fields, parse_timestamp
+from json_provider import FastJSONProvider
+from db_routing import ReplicaRouter, engine_options, pool_size_for, replica_binds
+from oauth import init_google_login
 from dotenv import load_dotenv
+from sqlalchemy.orm import load_only
+from sqlalchemy import delete, func, insert, literal, not_, or_, select, tuple_, update
 import uuid
+import csv
 import datetime
-app = Flask(__name__)
-CORS(app)
-# CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000", "methods": ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"], "allow_headers": "*"}})
-load_dotenv()  
-
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-
-app.config["SQLALCHEMY_DATABASE_URI"] = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-
-db.init_app(app)
-migrate = Migrate(app, db)
-
-jwt = JWTManager(app)
-
-# Google OAuth Configuration
-google_bp = make_google_blueprint(
-    client_id=os.getenv("GOOGLE_CLIENT_ID"),
-    client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    redirect_to="google_auth"
+import functools
+import threading
+import time
+import click
+
+# Before anything below reads the environment
+load_dotenv()
+
+api = Blueprint('api', __name__)
+jwt = JWTManager()
+request_metrics = RequestMetrics()
+replica_router = ReplicaRouter(db)
+
+# Revoked jtis live in memory; REVOCATION_SYNC_INTERVAL bounds how long other workers take to see a logout
+revoked_tokens = create_revocation_store(
+    os.getenv("REVOCATION_BACKEND", "database"),
+    sync_interval=float(os.getenv("REVOCATION_SYNC_INTERVAL", "1.0")),
+    bloom=os.getenv("REVOCATION_BLOOM", "false").lower() == "true"
+)
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return revoked_tokens.is_revoked(jwt_payload["jti"])
+
+# ACTIVITY_LOG_MODE=sync writes audit rows in the request transaction (tests); async batches them in the background
+activity_writer = ActivityWriter(
+    mode=os.getenv("ACTIVITY_LOG_MODE", "async"),
+    queue_size=int(os.getenv("ACTIVITY_QUEUE_SIZE", "10000")),
+    flush_size=int(os.getenv("ACTIVITY_FLUSH_SIZE", "500")),
+    flush_interval=float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "1.0"))
 )
-app.register_blueprint(google_bp, url_prefix="/login")
+
+# Serialized read responses, keyed by the user's data version (see conditional_get)
+read_cache = create_cache(
+    os.getenv("CACHE_BACKEND", "memory"),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "2048")),
+    ttl=int(os.getenv("CACHE_TTL", "300")),
+    redis_url=os.getenv("CACHE_REDIS_URL")
+)
+
+# Live change streams for /api/events. EVENTS_BACKEND=local only reaches streams in the same process;
+# with several workers use redis (or fake to exercise that path locally).
+# Every open stream holds a server thread, so EVENTS_MAX_STREAMS must stay below the worker's thread count.
+event_bus = create_event_bus(
+    os.getenv("EVENTS_BACKEND", "local"),
+    redis_url=os.getenv("EVENTS_REDIS_URL"),
+    history=int(os.getenv("EVENTS_HISTORY", "100")),
+    max_streams=int(os.getenv("EVENTS_MAX_STREAMS", "8")),
+    max_streams_per_user=int(os.getenv("EVENTS_MAX_STREAMS_PER_USER", "3"))
+)
+
+
+def load_config(app):
+    DB_USER = os.getenv("DB_USER")
+    DB_PASSWORD = os.getenv("DB_PASSWORD")
+    DB_HOST = os.getenv("DB_HOST")
+    DB_PORT = os.getenv("DB_PORT")
+    DB_NAME = os.getenv("DB_NAME")
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # DB_MAX_CONNECTIONS is the server-side budget; each of the WEB_CONCURRENCY gunicorn workers gets an equal fixed share
+    if os.getenv("DB_MAX_CONNECTIONS"):
+        DB_POOL_SIZE = pool_size_for(int(os.getenv("DB_MAX_CONNECTIONS")), int(os.getenv("WEB_CONCURRENCY", "1")))
+        DB_MAX_OVERFLOW = 0
+    else:
+        DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+        DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        statement_timeout=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    )
+    # Comma-separated replica URLs; two local databases work for testing (e.g. two sqlite files)
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(os.getenv("DATABASE_REPLICA_URLS", ""))
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    app.config["PASSWORD_HASH_MAX_PENDING"] = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "8"))
+    app.config["METRICS_STATEMENT_BUDGET"] = int(os.getenv("METRICS_STATEMENT_BUDGET", "25"))
+    # Opt-in: sample the stacks of requests and log them when one runs longer than this
+    app.config["PROFILE_SLOW_REQUESTS_MS"] = int(os.getenv("PROFILE_SLOW_REQUESTS_MS", "0"))
+    app.config["PROFILE_INTERVAL_MS"] = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    app.config["EVENTS_HEARTBEAT_SECONDS"] = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    app.config["EVENTS_MAX_STREAM_SECONDS"] = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "3600"))
+    # Google OAuth Configuration
+    app.config["GOOGLE_CLIENT_ID"] = os.getenv("GOOGLE_CLIENT_ID")
+    app.config["GOOGLE_CLIENT_SECRET"] = os.getenv("GOOGLE_CLIENT_SECRET")
+
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+def insert_contact_batch(user_id, batch, format):
+    # One executemany for the rows and one summarized activity entry per batch
+    db.session.execute(insert(Contacts), batch)
+    activity_writer.record(user_id, 'imported', format, f'{len(batch)} contacts')
+    event_bus.publish(user_id, 'resync', {'reason': 'import', 'count': len(batch)})
+    contact_stats.apply_changes(user_id, [(None, contact) for contact in batch])
+    db.session.execute(bump_data_version(user_id))
+    db.session.commit()
+    return len(batch)
+
+
+def current_user_id():
+    # Tokens carry the id as a string; the Uuid columns need a uuid.UUID to bind on every dialect
+    return uuid.UUID(get_jwt_identity())
+
+
+def bump_data_version(user_id):
+    return update(Users).where(Users.id == user_id).values(
+        data_version=Users.data_version + 1,
+        data_updated_at=datetime.datetime.utcnow()
+    )
+
+
+def conditional_get(view):
+    # Answers If-None-Match / If-Modified-Since from the user's data version without running the view,
+    # and otherwise serves the serialized body cached for that version when there is one
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = current_user_id()
+        version, updated_at = db.session.execute(
+            select(Users.data_version, Users.data_updated_at).where(Users.id == user_id)
+        ).one()
+        g.data_version = version
+        etag = f'{user_id}-{version}'
+        # HTTP dates have one-second resolution: while the version's second is still running, a second write
+        # could share its Last-Modified, so until then only the ETag is offered (RFC 9110 "weak" Last-Modified)
+        last_modified = None
+        if updated_at and updated_at.replace(microsecond=0) < datetime.datetime.utcnow().replace(microsecond=0):
+            last_modified = updated_at.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(last_modified and request.if_modified_since
+                                and last_modified <= request.if_modified_since)
+
+        if not_modified:
+            response = make_response(('', 304))
+        else:
+            key = f'{etag}:{request.full_path}'
+            body = read_cache.get(key)
+            if body is not None:
+                response = current_app.response_class(body, mimetype='application/json')
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    read_cache.set(key, response.get_data())
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+        return response
+    return wrapper
 
 
-@app.route("/")
+def replica_read(view):
+    # Runs a read-only view against a replica that has already seen the user's latest write
+    # (see ReplicaRouter.pick); with no replicas configured, or none caught up, it stays on the primary
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = current_user_id()
+        version = g.get('data_version')
+        if version is None:
+            version = db.session.execute(select(Users.data_version).where(Users.id == user_id)).scalar()
+        with replica_router.route(db.session, select(Users.data_version).where(Users.id == user_id), version):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+UPDATABLE_FIELDS = ['name', 'email', 'phone', 'categories', 'status', 'favorite']
+
+
+TRACKED_FIELDS = ['status', 'favorite', 'categories']
+
+
+def binned_values(values):
+    # Stamps binned_at for an UPDATE ... VALUES that moves contacts to the bin (keeping the first
+    # stamp if they already were there) and clears it when they leave
+    values = dict(values)
+    if 'status' in values:
+        values['binned_at'] = func.coalesce(Contacts.binned_at, datetime.datetime.utcnow()) \
+            if values['status'] == 'bin' else None
+    return values
+
+
+def execute_mutation(statement):
+    # Runs an UPDATE/DELETE ... RETURNING scoped to one user and bumps that user's data version;
+    # deletes also leave a tombstone per contact for /api/contacts/sync, and every change is published to /api/events.
+    # Returns (before, after) dicts for every changed contact; after is None for deletes.
+    columns = list(Contacts.__table__.c)
+    is_update = statement.is_update
+    if db.engine.dialect.name == 'postgresql':
+        if is_update:
+            # UPDATE ... FROM a locked snapshot of the same rows exposes their pre-update values
+            previous = select(Contacts.id, *[Contacts.__table__.c[field] for field in TRACKED_FIELDS]) \
+                .where(statement.whereclause).with_for_update().subquery('previous')
+            statement = statement.where(Contacts.id == previous.c.id).returning(
+                *columns, *[previous.c[field].label(f'previous_{field}') for field in TRACKED_FIELDS]
+            )
+        else:
+            statement = statement.returning(*columns)
+        # Data-modifying CTE: the mutation, the version bump and the result come back in one round trip
+        changed = statement.cte('changed')
+        ctes = [bump_data_version(select(changed.c.user_id).limit(1).scalar_subquery()).cte('bumped')]
+        if statement.is_delete:
+            ctes.append(insert(ContactTombstone).from_select(
+                ['contact_id', 'user_id', 'deleted_at'],
+                select(changed.c.id, changed.c.user_id, literal(datetime.datetime.utcnow(), db.DateTime))
+            ).cte('tombstoned'))
+        rows = [row._mapping for row in db.session.execute(select(changed).add_cte(*ctes))]
+        if is_update:
+            changes = [({field: row[f'previous_{field}'] for field in TRACKED_FIELDS},
+                        {column.name: row[column.name] for column in columns}) for row in rows]
+    else:
+        if is_update:
+            previous = {row.id: row._mapping for row in db.session.execute(
+                select(Contacts.id, *[Contacts.__table__.c[field] for field in TRACKED_FIELDS]).where(statement.whereclause)
+            )}
+        rows = [row._mapping for row in db.session.execute(
+            statement.returning(*columns), execution_options={'synchronize_session': False}
+        )]
+        if rows:
+            db.session.execute(bump_data_version(rows[0]['user_id']))
+            if statement.is_delete:
+                deleted_at = datetime.datetime.utcnow()
+                db.session.execute(insert(ContactTombstone).values([
+                    {'contact_id': row['id'], 'user_id': row['user_id'], 'deleted_at': deleted_at} for row in rows
+                ]))
+        if is_update:
+            changes = [(dict(previous[row['id']]), dict(row)) for row in rows]
+    if not is_update:
+        changes = [(dict(row), None) for row in rows]
+    if changes:
+        event_bus.publish_contact_changes(rows[0]['user_id'], changes)
+    return changes
+
+
+# Runs a single-contact UPDATE/DELETE, records its activity and counters and returns the contact (or None)
+def mutate_contact(statement, action, action_type=''):
+    changes = execute_mutation(statement)
+    if not changes:
+        return None
+    before, after = changes[0]
+    contact = after or before
+    contact_stats.apply_changes(contact['user_id'], changes)
+    activity_writer.record(contact['user_id'], action, action_type(contact) if callable(action_type) else action_type,
+                           contact['name'])
+    db.session.commit()
+    return contact
+
+
+# Deletes the given binned contacts of one user with the usual delete bookkeeping (tombstones, counters,
+# events) plus one summarized activity entry; contacts restored in the meantime are left alone
+def delete_binned(user_id, ids, action):
+    changes = execute_mutation(delete(Contacts).where(Contacts.user_id == user_id, BINNED_CONTACT, Contacts.id.in_(ids)))
+    if changes:
+        contact_stats.apply_changes(user_id, changes)
+        activity_writer.record(user_id, action, '', f'{len(changes)} contacts')
+    return len(changes)
+
+
+def purge_expired_bin(cutoff, batch_size=500, pause=0.5):
+    # Deletes contacts binned before cutoff, oldest first, one small committed batch at a time with a
+    # pause in between, so row locks stay short and replicas can keep up with the deletes
+    purged = 0
+    while True:
+        rows = db.session.execute(
+            select(Contacts.user_id, Contacts.id)
+            .where(BINNED_CONTACT, Contacts.binned_at < cutoff)
+            .order_by(Contacts.binned_at, Contacts.id)
+            .limit(batch_size)
+        ).all()
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row.user_id, []).append(row.id)
+        for user_id, ids in by_user.items():
+            purged += delete_binned(user_id, ids, 'purged_bin')
+        db.session.commit()
+        if len(rows) < batch_size:
+            return purged
+        time.sleep(pause)
+
+
+@api.app_errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return jsonify({'error': 'Too many login attempts in progress, try again shortly'}), 503, {'Retry-After': '1'}
+
+
+@api.route("/")
 def home():
     return "Flask is running successfully!"
 
-@app.route('/login/google', methods=['POST'])
+@api.route('/login/google', methods=['POST'])
 def google_auth():
     data = request.json
     if not data or not data.get('email') or not data.get('oauth_id'):
@@ -65,7 +352,7 @@ def google_auth():
         "user": user.to_dict()
     })
 
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     data = request.json
     if not data or not data.get('name') or not data.get('email') or not data.get('password'):
@@ -83,13 +370,15 @@ def register():
     return jsonify({'message': 'User registered successfully'}), 201
 
 # Logout
-@app.route("/logout")
+@api.route("/logout")
 @jwt_required()
 def logout():
-    return jsonify({"message": "Token revoked (implement token blacklist)"}), 200
+    token = get_jwt()
+    revoked_tokens.revoke(token["jti"], token["exp"])
+    return jsonify({"message": "Token revoked"}), 200
 
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     if not data or not data.get('email') or not data.get('password'):
@@ -99,22 +388,33 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid credentials'}), 401
 
+    # Upgrade hashes made with an older BCRYPT_LOG_ROUNDS while the plaintext is at hand
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+
     access_token = create_access_token(identity=user.id)
     return jsonify({'access_token': access_token, 'user': user.to_dict()}), 200
 
-@app.route('/api/contacts', methods=['POST'])
+@api.route('/api/contacts', methods=['POST'])
 @jwt_required()
 def create_contact():
-    user_id = get_jwt_identity()
+    user_id = current_user_id()
     data = request.json
     if not data or not data.get('name') or not data.get('email'):
         return jsonify({'error': 'Name and email are required'}), 400
+    try:
+        categories = validate_categories(data.get('categories'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('status', 'active') not in VALID_STATUSES:
+        return jsonify({'error': f'Status must be one of: {", ".join(VALID_STATUSES)}'}), 400
 
     new_contact = Contacts(
         name=data['name'],
         email=data['email'],
         phone=data.get('phone', ''),
-        categories=data.get('categories', []),
+        categories=categories,
         status=data.get('status', 'active'),
         favorite=data.get('favorite', False),
         user_id=user_id
@@ -122,151 +422,789 @@ def create_contact():
 
     db.session.add(new_contact)
     
-    activity_log = ActivityLog(
-        user_id = user_id,
-        timestamp=datetime.datetime.now(),
-        action='added',
-        action_type='',
-        contact_name= data['name']
-    )
-    db.session.add(activity_log)
+    activity_writer.record(user_id, 'added', '', data['name'])
+    contact_stats.apply_changes(user_id, [(None, {
+        'status': new_contact.status,
+        'favorite': new_contact.favorite,
+        'categories': new_contact.categories
+    })])
+    db.session.execute(bump_data_version(user_id))
+    # The bump above flushed the insert, so the id and defaults are populated
+    contact = new_contact.to_dict()
+    event_bus.publish(user_id, 'contact.created', contact)
     db.session.commit()
+    search.invalidate(user_id)
+
+    return jsonify(contact), 201
+
+@api.route('/api/contacts/import', methods=['POST'])
+@jwt_required()
+def import_contacts():
+    user_id = current_user_id()
+    upload = request.files.get('file')
+    if upload:
+        stream, filename, mimetype = upload.stream, upload.filename, upload.mimetype
+    else:
+        stream, filename, mimetype = request.stream, None, request.mimetype
+
+    format = request.args.get('format') or detect_format(filename, mimetype)
+    if format not in FORMATS:
+        return jsonify({'error': f'Format must be one of: {", ".join(FORMATS)}'}), 400
+
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    try:
+        for row_number, row in enumerate(read_rows(stream, format), start=1):
+            try:
+                contact = validate_row(row)
+            except RowError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': row_number, 'error': str(e)})
+                continue
+
+            contact['user_id'] = user_id
+            batch.append(contact)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += insert_contact_batch(user_id, batch, format)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append({'row': None, 'error': f'Could not parse file: {e}'})
 
-    return jsonify(new_contact.to_dict()), 201
+    if batch:
+        imported += insert_contact_batch(user_id, batch, format)
+    if imported:
+        search.invalidate(user_id)
 
-@app.route('/api/contacts', methods=['GET'])
+    return jsonify({'imported': imported, 'failed': failed, 'errors': errors}), 200
+
+
+EXPORT_CHUNK_SIZE = 500
+
+
+@api.route('/api/contacts/export', methods=['GET'])
 @jwt_required()
+def export_contacts():
+    user_id = current_user_id()
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+
+    # yield_per streams rows from a server-side cursor instead of materializing the whole result
+    query = select(Contacts).where(Contacts.user_id == user_id, LIVE_CONTACT).order_by(Contacts.created_at, Contacts.id) \
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+    def contacts():
+        for contact in db.session.scalars(query):
+            yield contact.to_dict()
+            # Rows already written to the response are not needed by the identity map anymore
+            db.session.expunge(contact)
+
+    mimetype, extension = EXPORT_FORMATS[format]
+    return Response(
+        stream_with_context(write_rows(contacts(), format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=contacts.{extension}'}
+    )
+
+
+@api.route('/api/contacts', methods=['GET'])
+@jwt_required()
+@conditional_get
+@replica_read
 def get_contacts():
-    user_id = get_jwt_identity()
-    contacts = Contacts.query.filter_by(user_id=user_id).all()
-    return jsonify([contact.to_dict() for contact in contacts])
+    user_id = current_user_id()
+    try:
+        fields = parse_fields(request.args.get('fields'), CONTACT_FIELDS) or list(CONTACT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': f'Unknown fields: {e}'}), 400
+
+    # Column-only select: rows come back as tuples instead of ORM instances, and the JSON provider
+    # encodes the UUID / datetime values directly. created_at and id are always read for the cursor.
+    columns = [Contacts.__table__.c[name] for name in dict.fromkeys(fields + ['created_at'])]
+    query = select(*columns).where(Contacts.user_id == user_id)
+
+    # Binned contacts only show up when asked for with status=bin
+    status = request.args.get('status')
+    if status == 'bin':
+        query = query.where(BINNED_CONTACT)
+    elif status:
+        query = query.where(Contacts.status == status)
+    else:
+        query = query.where(LIVE_CONTACT)
+
+    try:
+        favorite = parse_bool(request.args.get('favorite'))
+    except ValueError:
+        return jsonify({'error': 'favorite must be true or false'}), 400
+    if favorite is not None:
+        query = query.where(Contacts.favorite == favorite)
+
+    category = request.args.get('category')
+    if category:
+        query = query.where(category_filter(category))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        # Row-value comparison lets the (user_id, ..., created_at, id) indexes seek straight to the page
+        query = query.where(tuple_(Contacts.created_at, Contacts.id) > tuple_(created_at, last_id))
+
+    limit = page_size(request.args.get('limit', type=int))
+    # Fetch one extra row to know whether another page exists without a COUNT(*)
+    rows = db.session.execute(query.order_by(Contacts.created_at, Contacts.id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return jsonify({
+        'contacts': [{name: row._mapping[name] for name in fields} for row in rows],
+        'next_cursor': next_cursor
+    })
+
+
+# Changes stamped inside this window may belong to transactions that have not committed yet,
+# so sync leaves them for the next call instead of moving the cursor past them
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+
+@api.route('/api/contacts/sync', methods=['GET'])
+@jwt_required()
+def sync_contacts():
+    user_id = current_user_id()
+    now = datetime.datetime.utcnow()
+    until = now - datetime.timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since_at, since_id = decode_cursor(since)
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if since_at < now - datetime.timedelta(days=SYNC_TOMBSTONE_DAYS):
+            return jsonify({'error': 'Cursor is older than the deletion history, a full sync is required'}), 410
+
+    limit = page_size(request.args.get('limit', type=int))
+    changed = select(*[Contacts.__table__.c[name] for name in CONTACT_FIELDS]) \
+        .where(Contacts.user_id == user_id, Contacts.updated_at < until)
+    if since:
+        changed = changed.where(tuple_(Contacts.updated_at, Contacts.id) > tuple_(since_at, since_id))
+    entries = [(row.updated_at, row.id, row) for row in
+               db.session.execute(changed.order_by(Contacts.updated_at, Contacts.id).limit(limit + 1))]
+
+    # A first sync has nothing to delete locally, so tombstones only matter with a cursor
+    if since:
+        deleted = select(ContactTombstone.contact_id, ContactTombstone.deleted_at).where(
+            ContactTombstone.user_id == user_id,
+            ContactTombstone.deleted_at < until,
+            tuple_(ContactTombstone.deleted_at, ContactTombstone.contact_id) > tuple_(since_at, since_id)
+        ).order_by(ContactTombstone.deleted_at, ContactTombstone.contact_id).limit(limit + 1)
+        entries += [(row.deleted_at, row.contact_id, None) for row in db.session.execute(deleted)]
+
+    # Both streams are already in (timestamp, id) order; the page is the first `limit` of the two combined
+    entries.sort(key=lambda entry: entry[:2])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if has_more:
+        next_cursor = encode_cursor(entries[-1][0], entries[-1][1])
+    else:
+        next_cursor = encode_cursor(until, uuid.UUID(int=0))
+
+    return jsonify({
+        'contacts': [dict(row._mapping) for _, _, row in entries if row is not None],
+        'deleted': [id for _, id, row in entries if row is None],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
+
+
+@api.route('/api/contacts/stats', methods=['GET'])
+@jwt_required()
+def get_contact_stats():
+    # Reads the user's counter rows, so the cost does not depend on how many contacts they have
+    return jsonify(contact_stats.get_stats(current_user_id()))
+
+
+@api.route('/api/categories', methods=['GET'])
+@jwt_required()
+def get_categories():
+    return jsonify(contact_stats.category_counts(current_user_id()))
+
+
+@api.route('/api/categories/rename', methods=['POST'])
+@jwt_required()
+def rename_category():
+    user_id = current_user_id()
+    data = request.json
+    if not data or not all(isinstance(data.get(key), str) and data[key].strip() for key in ('from', 'to')):
+        return jsonify({'error': 'from and to must be non-empty strings'}), 400
+    if len(data['from']) > MAX_CATEGORY_LENGTH or len(data['to']) > MAX_CATEGORY_LENGTH:
+        return jsonify({'error': f'Categories must be at most {MAX_CATEGORY_LENGTH} characters'}), 400
+    if data['from'] == data['to']:
+        return jsonify({'error': 'from and to must differ'}), 400
+
+    # Renaming onto an existing category merges the two; one UPDATE covers every affected contact
+    changes = execute_mutation(
+        update(Contacts)
+        .where(Contacts.user_id == user_id, category_filter(data['from']))
+        .values(categories=renamed_categories(data['from'], data['to']))
+    )
+    if changes:
+        contact_stats.apply_changes(user_id, changes)
+        activity_writer.record(user_id, 'renamed_category', data['to'], f'{len(changes)} contacts')
+    db.session.commit()
+
+    return jsonify({'from': data['from'], 'to': data['to'], 'count': len(changes)}), 200
+
+
+@api.route('/api/contacts/search', methods=['GET'])
+@jwt_required()
+def search_contacts():
+    user_id = current_user_id()
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+
+    limit = max(1, min(request.args.get('limit', search.DEFAULT_LIMIT, type=int), search.MAX_LIMIT))
+    contacts = search.search_contacts(user_id, q, limit)
+    return jsonify({'contacts': [contact.to_dict() for contact in contacts]})
+
+
+MAX_LOOKUP_VALUES = 500
+LOOKUP_FIELDS = ['id', 'name', 'email', 'phone', 'status', 'favorite']
+
+
+@api.route('/api/contacts/lookup', methods=['POST'])
+@jwt_required()
+def lookup_contacts():
+    user_id = current_user_id()
+    data = request.json or {}
+    emails, phones = data.get('emails') or [], data.get('phones') or []
+    if not isinstance(emails, list) or not isinstance(phones, list) or not (emails or phones):
+        return jsonify({'error': 'Provide a list of emails and/or a list of phones'}), 400
+    if len(emails) + len(phones) > MAX_LOOKUP_VALUES:
+        return jsonify({'error': f'At most {MAX_LOOKUP_VALUES} emails and phones can be looked up at once'}), 400
+
+    email_keys = {str(value): canonical_email(str(value)) for value in emails}
+    phone_keys = {str(value): canonical_phone(str(value)) for value in phones}
+    wanted_emails = {key for key in email_keys.values() if key}
+    wanted_phones = {key for key in phone_keys.values() if key}
+
+    matches = {}
+    if wanted_emails or wanted_phones:
+        # One statement; each IN list is served by its (user_id, *_normalized) index
+        columns = [Contacts.__table__.c[name] for name in LOOKUP_FIELDS]
+        rows = db.session.execute(
+            select(*columns, Contacts.email_normalized, Contacts.phone_normalized)
+            .where(Contacts.user_id == user_id, LIVE_CONTACT,
+                   or_(Contacts.email_normalized.in_(wanted_emails), Contacts.phone_normalized.in_(wanted_phones)))
+            .order_by(Contacts.created_at, Contacts.id)
+        )
+        for row in rows:
+            contact = {name: row._mapping[name] for name in LOOKUP_FIELDS}
+            if row.email_normalized in wanted_emails:
+                matches.setdefault(('email', row.email_normalized), []).append(contact)
+            if row.phone_normalized in wanted_phones:
+                matches.setdefault(('phone', row.phone_normalized), []).append(contact)
 
+    return jsonify({
+        'emails': {value: matches.get(('email', key), []) for value, key in email_keys.items()},
+        'phones': {value: matches.get(('phone', key), []) for value, key in phone_keys.items()}
+    })
 
-@app.route('/api/contacts/<string:id>', methods=['GET'])
+
+@api.route('/api/contacts/<string:id>', methods=['GET'])
 @jwt_required()
+@conditional_get
+@replica_read
 def get_contact(id):
     id = uuid.UUID(id)
-    user_id = get_jwt_identity()
-    contact = Contacts.query.filter_by(id=id, user_id=user_id).first()
+    user_id = current_user_id()
+    try:
+        fields = parse_fields(request.args.get('fields'), CONTACT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': f'Unknown fields: {e}'}), 400
+    query = Contacts.query.filter_by(id=id, user_id=user_id)
+    if fields:
+        query = query.options(load_only(*[getattr(Contacts, name) for name in fields]))
+    contact = query.first()
     if not contact:
         return jsonify({'error': 'Contact not found'}), 404
-    return jsonify(contact.to_dict())
+    return jsonify(contact.to_dict(fields))
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(request_metrics.render(db.engines), mimetype='text/plain; version=0.0.4')
 
-@app.route('/api/user-activities', methods=['GET'])
+
+@api.route('/api/cache/stats', methods=['GET'])
 @jwt_required()
+def cache_stats():
+    return jsonify(read_cache.stats())
+
+
+@api.route('/api/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    # Server-Sent Events: contact.updated / contact.deleted / activity as they are committed, and
+    # resync when the client should refetch through /api/contacts/sync instead. EventSource cannot
+    # send headers, so the token may also come as ?jwt=.
+    user_id = current_user_id()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        subscription, missed = event_bus.subscribe(user_id, last_event_id)
+    except TooManyStreams:
+        return jsonify({'error': 'Too many open event streams'}), 429, {'Retry-After': '30'}
+
+    # The stream can stay open for an hour; it must not keep a pooled connection checked out meanwhile
+    db.session.remove()
+    max_seconds = current_app.config['EVENTS_MAX_STREAM_SECONDS']
+    if 'exp' in get_jwt():
+        # Never outlive the token that opened the stream
+        max_seconds = min(max_seconds, get_jwt()['exp'] - datetime.datetime.now(datetime.timezone.utc).timestamp())
+    response = Response(
+        event_bus.stream(subscription, missed, heartbeat=current_app.config['EVENTS_HEARTBEAT_SECONDS'],
+                         max_seconds=max_seconds),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(lambda: event_bus.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stops nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route('/api/events/stats', methods=['GET'])
+@jwt_required()
+def event_stats():
+    return jsonify(event_bus.stats())
+
+@api.route('/api/user-activities', methods=['GET'])
+@jwt_required()
+@conditional_get
+@replica_read
 def get_user_activities():
-    user_id = get_jwt_identity()
-    user_activities = ActivityLog.query.filter_by(user_id=user_id).all()
-    return jsonify([user_activity.to_dict() for user_activity in user_activities])
+    user_id = current_user_id()
+    query = ActivityLog.query.filter_by(user_id=user_id)
+
+    try:
+        start, end = parse_timestamp(request.args.get('from')), parse_timestamp(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 timestamps'}), 400
+    if start:
+        query = query.filter(ActivityLog.timestamp >= start)
+    if end:
+        query = query.filter(ActivityLog.timestamp < end)
 
-@app.route('/api/contacts/<string:id>', methods=['PUT'])
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            timestamp, last_id = decode_cursor(cursor)
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(tuple_(ActivityLog.timestamp, ActivityLog.id) < tuple_(timestamp, last_id))
+
+    # Newest first, walking ix_activity_log_user_id_timestamp_id backwards
+    limit = page_size(request.args.get('limit', type=int))
+    user_activities = query.order_by(ActivityLog.timestamp.desc(), ActivityLog.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(user_activities) > limit:
+        user_activities = user_activities[:limit]
+        next_cursor = encode_cursor(user_activities[-1].timestamp, user_activities[-1].id)
+
+    return jsonify({
+        'activities': [user_activity.to_dict() for user_activity in user_activities],
+        'next_cursor': next_cursor
+    })
+
+@api.route('/api/user-activities/rollup', methods=['GET'])
+@jwt_required()
+def get_user_activity_rollup():
+    user_id = current_user_id()
+    query = ActivityDailyCount.query.filter_by(user_id=user_id)
+
+    try:
+        start, end = parse_timestamp(request.args.get('from')), parse_timestamp(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 dates'}), 400
+    if start:
+        query = query.filter(ActivityDailyCount.day >= start.date())
+    if end:
+        query = query.filter(ActivityDailyCount.day <= end.date())
+
+    counts = query.order_by(ActivityDailyCount.day, ActivityDailyCount.action).all()
+    return jsonify([count.to_dict() for count in counts])
+
+@api.route('/api/contacts/<string:id>', methods=['PUT'])
 @jwt_required()
 def update_contact(id):
     id = uuid.UUID(id)
-    user_id = get_jwt_identity()
-    contact = Contacts.query.filter_by(id=id, user_id=user_id).first()
+    user_id = current_user_id()
+    data = request.json or {}
 
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-
-    data = request.json
-    contact.name = data.get('name', contact.name)
-    contact.email = data.get('email', contact.email)
-    contact.phone = data.get('phone', contact.phone)
-    contact.categories = data.get('categories', contact.categories)
-    contact.status = data.get('status', contact.status)  
-    contact.favorite = data.get('favorite', contact.favorite)
+    values = {field: data[field] for field in UPDATABLE_FIELDS if field in data}
+    if 'categories' in values:
+        try:
+            values['categories'] = validate_categories(values['categories'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if 'status' in values and values['status'] not in VALID_STATUSES:
+        return jsonify({'error': f'Status must be one of: {", ".join(VALID_STATUSES)}'}), 400
+    if not values:
+        # Nothing to change, but the contact must still exist and the update is still logged
+        values = {'name': Contacts.name}
 
-    db.session.commit()
-    activity = ActivityLog(\
-        user_id = user_id,
-        timestamp=datetime.datetime.now(),
-        action='updated',
-        action_type='',
-        contact_name= contact.name
+    row = mutate_contact(
+        update(Contacts).where(Contacts.id == id, Contacts.user_id == user_id).values(**binned_values(normalized_values(values))),
+        action='updated'
     )
-    db.session.add(activity)
-    return jsonify(contact.to_dict())
+    if not row:
+        return jsonify({'error': 'Contact not found'}), 404
 
-@app.route('/api/contacts/<string:id>/toggle-favorite', methods=['PATCH'])
+    search.invalidate(user_id)
+    return jsonify(Contacts(**row).to_dict())
+
+@api.route('/api/contacts/<string:id>/toggle-favorite', methods=['PATCH'])
 @jwt_required()
 def toggle_favorite(id):
     id = uuid.UUID(id)
-    user_id = get_jwt_identity()
-    contact = Contacts.query.filter_by(id=id, user_id=user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
-    contact.favorite = not contact.favorite
-    activity = ActivityLog(
-        user_id=user_id,
-        timestamp=datetime.datetime.now(),
+    user_id = current_user_id()
+
+    row = mutate_contact(
+        update(Contacts).where(Contacts.id == id, Contacts.user_id == user_id).values(favorite=not_(Contacts.favorite)),
         action='toggle_favorite',
-        contact_name= contact.name,
-        action_type="not favorite" if contact.favorite else "favorite"
+        action_type=lambda row: "not favorite" if row['favorite'] else "favorite"
     )
-    db.session.add(activity)
-    
-    db.session.commit()
-    
-    return jsonify({'message': 'Favorite status updated', 'favorite': contact.favorite})
+    if not row:
+        return jsonify({'error': 'Contact not found'}), 404
 
-@app.route('/api/contacts/<string:id>/set-status', methods=['PATCH'])
+    return jsonify({'message': 'Favorite status updated', 'favorite': row['favorite']})
+
+@api.route('/api/contacts/<string:id>/set-status', methods=['PATCH'])
 @jwt_required()
 def set_status(id):
     id = uuid.UUID(id)
-    user_id = get_jwt_identity()
-    contact = Contacts.query.filter_by(id=id, user_id=user_id).first()
-    
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
+    user_id = current_user_id()
+
     data = request.json
     if not data or not data.get('status'):
         return jsonify({'error': 'Status is required'}), 400
-    
+
     # Validate status
-    valid_statuses = ['active', 'blocked', 'bin']
-    if data['status'] not in valid_statuses:
-        return jsonify({'error': f'Status must be one of: {", ".join(valid_statuses)}'}), 400
-    
-    contact.status = data['status']
-    activity = ActivityLog(
-        user_id=user_id,
-        timestamp=datetime.datetime.now(),
+    if data['status'] not in VALID_STATUSES:
+        return jsonify({'error': f'Status must be one of: {", ".join(VALID_STATUSES)}'}), 400
+
+    row = mutate_contact(
+        update(Contacts).where(Contacts.id == id, Contacts.user_id == user_id).values(**binned_values({'status': data['status']})),
         action='set_status',
-        contact_name= contact.name,
         action_type=data['status']
     )
-    db.session.add(activity)
+    if not row:
+        return jsonify({'error': 'Contact not found'}), 404
+
+    # Moving in or out of the bin changes what search can return
+    search.invalidate(user_id)
+    return jsonify({'message': 'Status updated', 'status': row['status']})
+
+MAX_BATCH_IDS = 1000
+BATCH_OPERATIONS = ['toggle_favorite', 'set_favorite', 'set_status', 'delete']
+
+
+@api.route('/api/contacts/batch', methods=['POST'])
+@jwt_required()
+def batch_contacts():
+    user_id = current_user_id()
+    data = request.json
+    if not data or not isinstance(data.get('ids'), list) or not data['ids']:
+        return jsonify({'error': 'A non-empty list of ids is required'}), 400
+    if len(data['ids']) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids can be changed at once'}), 400
+    try:
+        ids = {uuid.UUID(str(id)) for id in data['ids']}
+    except ValueError:
+        return jsonify({'error': 'ids must be valid UUIDs'}), 400
+
+    operation = data.get('operation')
+    if operation not in BATCH_OPERATIONS:
+        return jsonify({'error': f'Operation must be one of: {", ".join(BATCH_OPERATIONS)}'}), 400
+
+    scope = (Contacts.user_id == user_id, Contacts.id.in_(ids))
+    if operation == 'delete':
+        statement = delete(Contacts).where(*scope)
+        action = 'deleted'
+    elif operation == 'set_status':
+        if data.get('status') not in VALID_STATUSES:
+            return jsonify({'error': f'Status must be one of: {", ".join(VALID_STATUSES)}'}), 400
+        statement = update(Contacts).where(*scope).values(**binned_values({'status': data['status']}))
+        action = 'set_status'
+    elif operation == 'set_favorite':
+        if not isinstance(data.get('favorite'), bool):
+            return jsonify({'error': 'favorite must be true or false'}), 400
+        statement = update(Contacts).where(*scope).values(favorite=data['favorite'])
+        action = 'toggle_favorite'
+    else:
+        statement = update(Contacts).where(*scope).values(favorite=not_(Contacts.favorite))
+        action = 'toggle_favorite'
+
+    # One set-based statement for every contact; RETURNING tells us which ids really belonged to the user
+    changes = execute_mutation(statement)
+
+    if changes:
+        now = datetime.datetime.utcnow()
+        activities = []
+        for before, after in changes:
+            row = after or before
+            if action == 'set_status':
+                action_type = row['status']
+            elif action == 'toggle_favorite':
+                action_type = "not favorite" if row['favorite'] else "favorite"
+            else:
+                action_type = ''
+            activities.append({
+                'user_id': user_id,
+                'timestamp': now,
+                'action': action,
+                'action_type': action_type,
+                'contact_name': row['name']
+            })
+        activity_writer.record_many(activities)
+        contact_stats.apply_changes(user_id, changes)
     db.session.commit()
-    
-    return jsonify({'message': 'Status updated', 'status': contact.status})
+    if operation in ('delete', 'set_status') and changes:
+        search.invalidate(user_id)
+
+    affected = [str((after or before)['id']) for before, after in changes]
+    return jsonify({'affected': affected, 'count': len(affected)}), 200
+
+
+MAX_DUPLICATE_GROUPS = 500
+
+
+@api.route('/api/contacts/duplicates', methods=['GET'])
+@jwt_required()
+def get_duplicate_contacts():
+    user_id = current_user_id()
+    query = select(Contacts.id, Contacts.name, Contacts.email, Contacts.phone) \
+        .where(Contacts.user_id == user_id, LIVE_CONTACT).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+    contacts = {}
+
+    def rows():
+        for row in db.session.execute(query):
+            contacts[row.id] = row
+            yield row
+
+    groups = find_duplicate_groups(rows())[:MAX_DUPLICATE_GROUPS]
+    return jsonify([{
+        'reasons': reasons,
+        'contacts': [{
+            'id': str(id),
+            'name': contacts[id].name,
+            'email': contacts[id].email,
+            'phone': contacts[id].phone
+        } for id in ids]
+    } for ids, reasons in groups])
+
 
-@app.route('/api/contacts/<string:id>', methods=['DELETE'])
+@api.route('/api/contacts/merge', methods=['POST'])
+@jwt_required()
+def merge_contacts():
+    user_id = current_user_id()
+    data = request.json
+    if not data or not data.get('keep') or not isinstance(data.get('merge'), list) or not data['merge']:
+        return jsonify({'error': 'keep and a non-empty merge list are required'}), 400
+    if len(data['merge']) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids can be merged at once'}), 400
+    try:
+        keep_id = uuid.UUID(str(data['keep']))
+        merge_ids = {uuid.UUID(str(id)) for id in data['merge']} - {keep_id}
+    except ValueError:
+        return jsonify({'error': 'ids must be valid UUIDs'}), 400
+
+    contacts = {contact.id: contact for contact in Contacts.query.filter(
+        Contacts.user_id == user_id, Contacts.id.in_(merge_ids | {keep_id}))}
+    keeper = contacts.pop(keep_id, None)
+    if not keeper or not contacts:
+        return jsonify({'error': 'Contact not found'}), 404
+    losers = list(contacts.values())
+    merged = merged_fields(keeper, losers)
+    # The union of every category list must still be one that create/update would accept
+    try:
+        merged['categories'] = validate_categories(merged['categories'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    values = binned_values(normalized_values(merged))
+
+    # Losers go in one DELETE, the keeper gets one UPDATE; both feed the stats counters
+    changes = execute_mutation(delete(Contacts).where(Contacts.user_id == user_id, Contacts.id.in_(contacts)))
+    changes += execute_mutation(update(Contacts).where(Contacts.user_id == user_id, Contacts.id == keep_id).values(**values))
+    contact_stats.apply_changes(user_id, changes)
+    activity_writer.record(user_id, 'merged', f'{len(losers)} duplicates', keeper.name)
+    db.session.commit()
+    search.invalidate(user_id)
+
+    merged = next(after for before, after in changes if after)
+    return jsonify({'contact': Contacts(**merged).to_dict(), 'merged': [str(id) for id in contacts]}), 200
+
+
+@api.route('/api/contacts/<string:id>', methods=['DELETE'])
 @jwt_required()
 def delete_contact(id):
     id = uuid.UUID(id)
-    user_id = get_jwt_identity()
-    contact = Contacts.query.filter_by(id=id, user_id=user_id).first()
+    user_id = current_user_id()
 
-    if not contact:
+    row = mutate_contact(
+        delete(Contacts).where(Contacts.id == id, Contacts.user_id == user_id),
+        action='deleted'
+    )
+    if not row:
         return jsonify({'error': 'Contact not found'}), 404
 
-    activity = ActivityLog(
-        user_id=user_id,
-        action='deleted',
-        action_type='',
-        timestamp=datetime.datetime.now(),
-        contact_name= contact.name
-    )
-    db.session.add(activity)
-    db.session.delete(contact)
+    search.invalidate(user_id)
+    return jsonify({'message': 'Contact deleted successfully'}), 200
+
+
+BIN_RETENTION_DAYS = int(os.getenv("BIN_RETENTION_DAYS", "30"))
+BIN_EMPTY_BATCH_SIZE = 500
+
+
+@api.route('/api/contacts/bin/empty', methods=['POST'])
+@jwt_required()
+def empty_bin():
+    # Resumable: each call deletes one bounded batch of what was in the bin at `before`. The first call
+    # leaves it out and gets it back; the client repeats the call with it until has_more is false.
+    user_id = current_user_id()
+    try:
+        before = parse_timestamp(request.args.get('before')) or datetime.datetime.utcnow()
+    except ValueError:
+        return jsonify({'error': 'before must be an ISO 8601 timestamp'}), 400
+
+    ids = db.session.scalars(
+        select(Contacts.id)
+        .where(Contacts.user_id == user_id, BINNED_CONTACT, Contacts.binned_at <= before)
+        .order_by(Contacts.binned_at, Contacts.id)
+        .limit(BIN_EMPTY_BATCH_SIZE + 1)
+    ).all()
+    deleted = delete_binned(user_id, ids[:BIN_EMPTY_BATCH_SIZE], 'emptied_bin')
     db.session.commit()
+    if deleted:
+        search.invalidate(user_id)
 
-    return jsonify({'message': 'Contact deleted successfully'}), 200
+    return jsonify({'deleted': deleted, 'has_more': len(ids) > BIN_EMPTY_BATCH_SIZE, 'before': before.isoformat()}), 200
+
+
+@click.command('prune-activities')
+@with_appcontext
+@click.option('--days', type=int, default=lambda: int(os.getenv("ACTIVITY_RETENTION_DAYS", "90")), show_default='90',
+              help='Keep activity rows newer than this many days.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--pause', default=0.1, show_default=True, help='Seconds to sleep between batches.')
+def prune_activities_command(days, batch_size, pause):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    deleted = prune_activities(cutoff, batch_size=batch_size, pause=pause)
+    click.echo(f'Deleted {deleted} activity rows older than {cutoff.isoformat()}')
+
+
+@click.command('purge-bin')
+@with_appcontext
+@click.option('--days', type=int, default=lambda: BIN_RETENTION_DAYS, show_default='30',
+              help='Delete contacts that have been in the bin for longer than this many days.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--pause', default=0.5, show_default=True, help='Seconds to sleep between batches.')
+def purge_bin_command(days, batch_size, pause):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    purged = purge_expired_bin(cutoff, batch_size=batch_size, pause=pause)
+    click.echo(f'Purged {purged} contacts binned before {cutoff.isoformat()}')
+
+
+@click.command('prune-tombstones')
+@with_appcontext
+@click.option('--days', type=int, default=lambda: SYNC_TOMBSTONE_DAYS, show_default='30',
+              help='Keep tombstones newer than this many days; older sync cursors get a 410.')
+def prune_tombstones_command(days):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    result = db.session.execute(delete(ContactTombstone).where(ContactTombstone.deleted_at < cutoff))
+    db.session.commit()
+    click.echo(f'Deleted {result.rowcount} contact tombstones older than {cutoff.isoformat()}')
+
+
+@click.command('prune-revoked-tokens')
+@with_appcontext
+def prune_revoked_tokens_command():
+    deleted = revoked_tokens.backend.prune()
+    click.echo(f'Deleted {deleted} expired token revocations')
+
+
+@click.command('rebuild-contact-stats')
+@with_appcontext
+@click.option('--user-id', default=None, help='Only rebuild the counters of this user.')
+def rebuild_contact_stats_command(user_id):
+    contact_stats.rebuild_stats(uuid.UUID(user_id) if user_id else None)
+    click.echo('Contact stats rebuilt')
+
+
+CLI_COMMANDS = [prune_activities_command, purge_bin_command, prune_tombstones_command, prune_revoked_tokens_command,
+                rebuild_contact_stats_command]
+
+
+def init_cli(app):
+    # Only the flask command needs Migrate (and the alembic import behind it) and the maintenance commands
+    from flask_migrate import Migrate
+    Migrate(app, db)
+    for command in CLI_COMMANDS:
+        app.cli.add_command(command)
+
+
+def create_app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    CORS(app)
+    # CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000", "methods": ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"], "allow_headers": "*"}})
+    load_config(app)
+
+    db.init_app(app)
+    password_hasher.init_app(app)
+    request_metrics.init_app(app)
+    replica_router.init_app(app)
+    jwt.init_app(app)
+    activity_writer.init_app(app)
+    event_bus.init_app(app)
+    if event_bus.publish_activities not in activity_writer.listeners:
+        activity_writer.listeners.append(event_bus.publish_activities)
+
+    app.register_blueprint(api)
+    init_google_login(app)
+    # The flask command builds the app while resolving its subcommand, i.e. inside a click context.
+    # FLASK_RUN_FROM_CLI would miss `flask db upgrade` and friends: only `flask run` sets it.
+    if click.get_current_context(silent=True) is not None:
+        init_cli(app)
+    return app
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # `app` is built on first access, so `gunicorn app:app`, `flask --app app` and `from app import app`
+    # share one instance without paying for it on a bare import of this module
+    global _app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,73 @@
+"""Contact list serialization cost per 10k rows.
+
+Compares the original path (ORM instances -> to_dict() -> stdlib json) with column rows
+encoded by FastJSONProvider, for the full record and for a sparse id,name,favorite fieldset.
+No database is needed; rows are generated in memory.
+
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from flask import Flask
+
+from json_provider import FastJSONProvider, orjson
+from models import CONTACT_FIELDS, Contacts
+
+SPARSE_FIELDS = ['id', 'name', 'favorite']
+
+
+def synthetic_contacts(count):
+    user_id = uuid.uuid4()
+    start = datetime.datetime(2024, 1, 1)
+    return [
+        Contacts(id=uuid.uuid4(), name=f'Contact {i}', email=f'user{i}@example.com', phone=f'555{i:07d}',
+                 categories=['work', 'friends'][:i % 3], created_at=start + datetime.timedelta(seconds=i),
+                 status='active', favorite=i % 7 == 0, user_id=user_id)
+        for i in range(count)
+    ]
+
+
+def timed(label, fn, rows, repeat):
+    best = min(_run(fn) for _ in range(repeat))
+    size = len(fn())
+    print(f'{label:<38} {best * 1000:8.1f} ms / {rows} rows  {size / 1024:8.0f} KiB')
+
+
+def _run(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    contacts = synthetic_contacts(args.rows)
+    # What a column-only select hands the view: plain mappings of raw column values
+    full_rows = [{name: getattr(contact, name) for name in CONTACT_FIELDS} for contact in contacts]
+    sparse_rows = [{name: row[name] for name in SPARSE_FIELDS} for row in full_rows]
+    provider = FastJSONProvider(Flask(__name__))
+
+    print(f'encoder: {"orjson " + orjson.__version__ if orjson else "stdlib json (orjson not installed)"}')
+    timed('to_dict + json.dumps (before)',
+          lambda: json.dumps({'contacts': [c.to_dict() for c in contacts]},
+                             sort_keys=True, separators=(',', ':')).encode('utf-8'), args.rows, args.repeat)
+    timed('column rows + FastJSONProvider',
+          lambda: provider._dumps_bytes({'contacts': full_rows}), args.rows, args.repeat)
+    timed('sparse rows + FastJSONProvider',
+          lambda: provider._dumps_bytes({'contacts': sparse_rows}), args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Cold start: import time, create_app() time and time to first request.
+
+Each phase is measured in a fresh interpreter (--runs times, median reported):
+  import app          module import; the app object itself is built lazily
+  create_app()        config, extensions and blueprint registration
+  first request       GET / through the test client
+  cli create_app()    the same under the flask command, which adds Migrate and the CLI commands
+  oauth first use     importing flask_dance and building the Google blueprint on the first /login/google hit
+
+--gunicorn additionally starts gunicorn with and without --preload and times the first HTTP response.
+
+    DATABASE_URL=sqlite:// JWT_SECRET_KEY=x python benchmarks/bench_startup.py --runs 5 --gunicorn
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+flask_app = module.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+with flask_app.app_context():
+    from oauth import google_blueprint
+    google_blueprint(flask_app)
+oauth = time.perf_counter()
+import click
+with click.Context(click.Command('flask')):
+    module.create_app()
+cli = time.perf_counter()
+print(json.dumps({{'import app': imported - started, 'create_app()': created - imported,
+                   'first request': served - created, 'oauth first use': oauth - served,
+                   'cli create_app()': cli - oauth}}))
+'''
+
+
+def run_child(env):
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(root=ROOT)], env=env, cwd=ROOT, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_first_response(preload, workers, env, timeout=60):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--workers', str(workers), '--bind', f'127.0.0.1:{port}']
+    if preload:
+        command.append('--preload')
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError('gunicorn did not answer in time')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env.setdefault('JWT_SECRET_KEY', 'startup-benchmark')
+
+    samples = [run_child(env) for _ in range(args.runs)]
+    results = {name: statistics.median(sample[name] for sample in samples) for name in samples[0]}
+
+    if args.gunicorn:
+        for preload in (False, True):
+            label = f'gunicorn -w {args.workers}{" --preload" if preload else ""} first response'
+            results[label] = statistics.median(
+                gunicorn_first_response(preload, args.workers, env) for _ in range(args.runs)
+            )
+
+    for name, seconds in results.items():
+        print(f'{name:<42} {seconds * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    # Stores serialized responses. Keys embed the user's data_version, so a write that bumps the
+    # version (in the same transaction as the change) makes every older entry unreachable on commit.
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def stats(self):
+        return {'backend': 'none'}
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class SharedCache(CacheBackend):
+    # Wraps any client exposing get(key) and setex(key, ttl, value), e.g. redis.Redis.
+    # Eviction is the server's job there, so only hits and misses are counted locally.
+
+    def __init__(self, client, ttl=300, prefix='contacts-cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, value)
+
+    def stats(self):
+        with self.lock:
+            return {'backend': 'shared', 'hits': self.hits, 'misses': self.misses, 'evictions': None}
+
+
+class FakeSharedClient:
+    # In-process stand-in for a shared cache server, for local runs and tests
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        entry = self.values.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def setex(self, key, ttl, value):
+        self.values[key] = (time.monotonic() + ttl, value)
+
+
+def create_cache(backend, max_entries, ttl, redis_url=None):
+    if backend == 'none':
+        return NullCache()
+    if backend == 'fake':
+        return SharedCache(FakeSharedClient(), ttl=ttl)
+    if backend == 'redis':
+        import redis  # optional dependency, only needed for the shared backend
+        return SharedCache(redis.Redis.from_url(redis_url), ttl=ttl)
+    return LRUCache(max_entries=max_entries, ttl=ttl)
@@ -0,0 +1,45 @@
+from sqlalchemy import case, cast, distinct, exists, func, literal, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+
+from models import Contacts, db
+
+# On Postgres categories is a jsonb array covered by the GIN index ix_contacts_categories,
+# so containment filters and renames only touch the contacts that carry the category.
+
+# Each category also names a contact_stats bucket ('category:<name>', String(150))
+MAX_CATEGORY_LENGTH = 100
+MAX_CATEGORIES = 50
+
+
+def validate_categories(categories):
+    # Raises ValueError unless categories is a list of non-empty strings within the limits
+    if categories is None:
+        return []
+    if not isinstance(categories, list):
+        raise ValueError('categories must be a list of strings')
+    if len(categories) > MAX_CATEGORIES:
+        raise ValueError(f'At most {MAX_CATEGORIES} categories are allowed')
+    for category in categories:
+        if not isinstance(category, str) or not category.strip():
+            raise ValueError('categories must be a list of non-empty strings')
+        if len(category) > MAX_CATEGORY_LENGTH:
+            raise ValueError(f'Categories must be at most {MAX_CATEGORY_LENGTH} characters')
+    return categories
+
+
+def category_filter(category):
+    if db.engine.dialect.name == 'postgresql':
+        return type_coerce(Contacts.categories, JSONB).contains([category])
+    categories = func.json_each(Contacts.categories).table_valued('value')
+    return exists(select(1).select_from(categories).where(categories.c.value == category))
+
+
+def renamed_categories(old, new):
+    # SQL expression for the categories list with old replaced by new, without duplicating new
+    if db.engine.dialect.name == 'postgresql':
+        remaining = type_coerce(Contacts.categories, JSONB).op('-')(literal(old))
+        added = func.jsonb_build_array(new)
+        return remaining.op('||')(case((remaining.op('@>')(added), cast('[]', JSONB)), else_=added))
+    categories = func.json_each(Contacts.categories).table_valued('value')
+    renamed = case((categories.c.value == old, new), else_=categories.c.value)
+    return func.json(select(func.json_group_array(distinct(renamed))).select_from(categories).scalar_subquery())
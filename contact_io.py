@@ -0,0 +1,177 @@
+import codecs
+import csv
+import io
+import json
+import re
+
+from categories import validate_categories
+
+VALID_STATUSES = ['active', 'blocked', 'bin']
+FIELD_LIMITS = {'name': 100, 'email': 120, 'phone': 20}
+FORMATS = ('csv', 'vcard')
+CSV_COLUMNS = ['name', 'email', 'phone', 'categories', 'status', 'favorite']
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'vcard': ('text/vcard', 'vcf'),
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename, mimetype):
+    filename = (filename or '').lower()
+    mimetype = (mimetype or '').lower()
+    if filename.endswith(('.vcf', '.vcard')) or 'vcard' in mimetype:
+        return 'vcard'
+    if filename.endswith('.csv') or 'csv' in mimetype:
+        return 'csv'
+    return None
+
+
+def read_rows(stream, format):
+    # Both readers are generators over lines decoded one at a time, so only one record is in memory.
+    # Only iteration is needed: on Python 3.10 an upload's SpooledTemporaryFile cannot be wrapped in
+    # io.TextIOWrapper (it lacks readable()).
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    if format == 'vcard':
+        return read_vcards(text)
+    return read_csv(text)
+
+
+def read_csv(text):
+    for row in csv.DictReader(text):
+        yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+
+def read_vcards(text):
+    card = None
+    for line in _unfold(text):
+        name, _, value = line.partition(':')
+        prop = name.split(';')[0].upper()
+        if prop == 'BEGIN' and value.upper() == 'VCARD':
+            card = {}
+        elif prop == 'END' and value.upper() == 'VCARD':
+            if card is not None:
+                yield card
+            card = None
+        elif card is None:
+            continue
+        elif prop == 'FN':
+            card['name'] = _unescape(value)
+        elif prop == 'N' and 'name' not in card:
+            family, _, rest = value.partition(';')
+            given = rest.split(';')[0]
+            card['name'] = ' '.join(part for part in (_unescape(given), _unescape(family)) if part)
+        elif prop == 'EMAIL':
+            card.setdefault('email', _unescape(value))
+        elif prop == 'TEL':
+            card.setdefault('phone', _unescape(value))
+        elif prop == 'CATEGORIES':
+            card['categories'] = [_unescape(c) for c in re.split(r'(?<!\\),', value)]
+
+
+def _unfold(text):
+    # RFC 6350 folds long lines by starting continuation lines with a space or tab
+    pending = None
+    for line in text:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+def _unescape(value):
+    return value.replace('\\n', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\').strip()
+
+
+def validate_row(row):
+    name = (row.get('name') or '').strip()
+    email = (row.get('email') or '').strip()
+    if not name or not email:
+        raise RowError('Name and email are required')
+
+    categories = row.get('categories') or []
+    if isinstance(categories, str):
+        categories = categories.split(';')
+    if not isinstance(categories, list) or not all(isinstance(c, str) for c in categories):
+        raise RowError('categories must be a list of strings')
+
+    contact = {
+        'name': name,
+        'email': email,
+        'phone': (row.get('phone') or '').strip(),
+        'categories': [c.strip() for c in categories if c.strip()],
+        'status': (row.get('status') or 'active').strip(),
+        'favorite': (row.get('favorite') or '').strip().lower() in ('true', '1', 'yes'),
+    }
+    for field, limit in FIELD_LIMITS.items():
+        if len(contact[field]) > limit:
+            raise RowError(f'{field} must be at most {limit} characters')
+    if contact['status'] not in VALID_STATUSES:
+        raise RowError(f'Status must be one of: {", ".join(VALID_STATUSES)}')
+    try:
+        validate_categories(contact['categories'])
+    except ValueError as e:
+        raise RowError(str(e))
+    return contact
+
+
+def write_rows(contacts, format):
+    # Yields one chunk per contact so the response can be streamed as the cursor advances
+    if format == 'csv':
+        return write_csv(contacts)
+    if format == 'vcard':
+        return write_vcards(contacts)
+    return write_ndjson(contacts)
+
+
+def write_ndjson(contacts):
+    for contact in contacts:
+        yield json.dumps(contact) + '\n'
+
+
+def write_csv(contacts):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield _drain(buffer)
+    for contact in contacts:
+        writer.writerow([
+            contact['name'],
+            contact['email'],
+            contact['phone'] or '',
+            ';'.join(contact['categories'] or []),
+            contact['status'],
+            'true' if contact['favorite'] else 'false',
+        ])
+        yield _drain(buffer)
+
+
+def write_vcards(contacts):
+    for contact in contacts:
+        lines = ['BEGIN:VCARD', 'VERSION:3.0', f"FN:{_escape(contact['name'])}", f"EMAIL:{_escape(contact['email'])}"]
+        if contact['phone']:
+            lines.append(f"TEL:{_escape(contact['phone'])}")
+        if contact['categories']:
+            lines.append('CATEGORIES:' + ','.join(_escape(c) for c in contact['categories']))
+        lines.append('END:VCARD')
+        yield '\r\n'.join(lines) + '\r\n'
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace(',', '\\,').replace(';', '\\;')
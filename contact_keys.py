@@ -0,0 +1,48 @@
+import os
+import re
+
+
+def default_country_code():
+    # National numbers without a country prefix are assumed to belong to this calling code
+    return os.getenv('DEFAULT_PHONE_COUNTRY_CODE', '1')
+
+
+def canonical_email(email):
+    email = (email or '').strip().lower()
+    return email or None
+
+
+def canonical_phone(phone, country_code=None):
+    # E.164-style "+<country code><number>". An explicit "+" or "00" prefix is kept as the country code;
+    # otherwise one trunk "0" is dropped and the default country code is prepended.
+    country_code = country_code or default_country_code()
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = country_code + digits[1:]
+    elif not (len(digits) == len(country_code) + 10 and digits.startswith(country_code)):
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return f'+{digits}'
+
+
+def normalized_values(values):
+    # Adds the lookup columns for an UPDATE ... VALUES that sets email and/or phone
+    values = dict(values)
+    if 'email' in values:
+        values['email_normalized'] = canonical_email(values['email'])
+    if 'phone' in values:
+        values['phone_normalized'] = canonical_phone(values['phone'])
+    return values
+
+
+def default_from(column, canonical):
+    # Column default that derives the lookup key from the row being inserted (ORM and executemany alike)
+    def default(context):
+        return canonical(context.get_current_parameters().get(column))
+    return default
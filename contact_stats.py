@@ -0,0 +1,94 @@
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, distinct, func, insert, literal, select, true
+
+from categories import MAX_CATEGORY_LENGTH
+from contact_io import VALID_STATUSES
+from models import ContactStat, Contacts, db, increment_upsert
+
+STATUS_PREFIX = 'status:'
+CATEGORY_PREFIX = 'category:'
+
+
+def buckets(contact):
+    if contact is None:
+        return []
+    names = ['total', STATUS_PREFIX + contact['status']]
+    if contact['favorite']:
+        names.append('favorite')
+    # Routes validate categories; anything else that slipped into a row must not break the bucket key
+    categories = contact.get('categories')
+    if isinstance(categories, list):
+        names.extend(CATEGORY_PREFIX + category for category in set(categories)
+                     if isinstance(category, str) and len(category) <= MAX_CATEGORY_LENGTH)
+    return names
+
+
+def apply_changes(user_id, changes):
+    # changes is an iterable of (before, after) contact mappings, None standing for "did not exist"
+    counts = Counter()
+    for before, after in changes:
+        counts.update(buckets(after))
+        counts.subtract(buckets(before))
+
+    rows = [
+        {'user_id': uuid.UUID(str(user_id)), 'bucket': bucket, 'total': total}
+        for bucket, total in sorted(counts.items()) if total
+    ]
+    if rows:
+        db.session.execute(increment_upsert(ContactStat.__table__, ['user_id', 'bucket'], 'total'), rows)
+
+
+def category_counts(user_id):
+    return [
+        {'name': bucket[len(CATEGORY_PREFIX):], 'count': total}
+        for bucket, total in db.session.execute(
+            select(ContactStat.bucket, ContactStat.total)
+            .where(ContactStat.user_id == user_id, ContactStat.bucket.startswith(CATEGORY_PREFIX), ContactStat.total > 0)
+            .order_by(ContactStat.bucket)
+        )
+    ]
+
+
+def get_stats(user_id):
+    stats = {'total': 0, 'favorite': 0, 'status': {status: 0 for status in VALID_STATUSES}, 'categories': {}}
+    for bucket, total in db.session.execute(
+        select(ContactStat.bucket, ContactStat.total).where(ContactStat.user_id == user_id, ContactStat.total != 0)
+    ):
+        if bucket.startswith(CATEGORY_PREFIX):
+            stats['categories'][bucket[len(CATEGORY_PREFIX):]] = total
+        elif bucket.startswith(STATUS_PREFIX):
+            stats['status'][bucket[len(STATUS_PREFIX):]] = total
+        elif bucket in ('total', 'favorite'):
+            stats[bucket] = total
+    return stats
+
+
+def rebuild_stats(user_id=None):
+    # Reconciliation: recomputes every counter with GROUP BY queries over contacts
+    scope = [Contacts.user_id == user_id] if user_id else []
+    if user_id:
+        db.session.execute(delete(ContactStat).where(ContactStat.user_id == user_id))
+    else:
+        db.session.execute(delete(ContactStat))
+
+    if db.engine.dialect.name == 'postgresql':
+        categories = func.jsonb_array_elements_text(Contacts.categories).table_valued('value').lateral()
+    else:
+        # SQLite table-valued functions may reference earlier FROM entries without LATERAL
+        categories = func.json_each(Contacts.categories).table_valued('value')
+
+    queries = [
+        select(Contacts.user_id, literal('total'), func.count()).where(*scope).group_by(Contacts.user_id),
+        select(Contacts.user_id, literal('favorite'), func.count())
+        .where(Contacts.favorite, *scope).group_by(Contacts.user_id),
+        select(Contacts.user_id, literal(STATUS_PREFIX) + Contacts.status, func.count())
+        .where(*scope).group_by(Contacts.user_id, Contacts.status),
+        select(Contacts.user_id, literal(CATEGORY_PREFIX) + categories.c.value, func.count(distinct(Contacts.id)))
+        .select_from(Contacts).join(categories, true())
+        .where(*scope).group_by(Contacts.user_id, categories.c.value),
+    ]
+    for query in queries:
+        db.session.execute(insert(ContactStat).from_select(['user_id', 'bucket', 'total'], query))
+    db.session.commit()
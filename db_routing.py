@@ -0,0 +1,92 @@
+import contextlib
+import itertools
+import threading
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+REPLICA_PREFIX = 'replica_'
+
+
+def engine_options(uri, pool_size=5, max_overflow=10, pool_recycle=1800, pool_pre_ping=True, statement_timeout=0):
+    options = {'pool_recycle': pool_recycle, 'pool_pre_ping': pool_pre_ping}
+    # SQLite's in-memory / singleton pools reject QueuePool sizing
+    if not uri.startswith('sqlite'):
+        options['pool_size'] = pool_size
+        options['max_overflow'] = max_overflow
+    if statement_timeout and uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def pool_size_for(max_connections, workers):
+    # Split a server-side connection budget evenly across gunicorn workers
+    return max(1, max_connections // max(1, workers))
+
+
+def replica_binds(urls):
+    # "postgresql://r1/db,postgresql://r2/db" -> {'replica_0': ..., 'replica_1': ...}
+    urls = [url.strip() for url in urls.split(',') if url.strip()]
+    return {f'{REPLICA_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+class RoutingSession(Session):
+    # While session.info['replica'] is set, plain reads go to that engine. Flushes and
+    # UPDATE / INSERT / DELETE statements always resolve to the primary.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing \
+                and (clause is None or getattr(clause, 'is_select', False)):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, db, app=None):
+        self.db = db
+        self.bind_keys = []
+        self._order = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        self.bind_keys = sorted(key for key in binds if key.startswith(REPLICA_PREFIX))
+        self._order = itertools.cycle(range(len(self.bind_keys))) if self.bind_keys else None
+
+    def _candidates(self):
+        with self._lock:
+            start = next(self._order)
+        keys = self.bind_keys[start:] + self.bind_keys[:start]
+        return [self.db.engines[key] for key in keys]
+
+    def pick(self, session, version_query, min_version):
+        # First replica (round robin) whose copy of the user's data_version has caught up with
+        # the primary's, so a read right after a write never sees the pre-write state
+        if not self.bind_keys or min_version is None:
+            return None
+        for engine in self._candidates():
+            session.info['replica'] = engine
+            try:
+                version = session.execute(version_query).scalar()
+            except OperationalError:
+                session.rollback()
+                version = None
+            finally:
+                session.info.pop('replica', None)
+            if version is not None and version >= min_version:
+                return engine
+        return None
+
+    @contextlib.contextmanager
+    def route(self, session, version_query, min_version):
+        engine = self.pick(session, version_query, min_version)
+        if engine is None:
+            yield None
+            return
+        session.info['replica'] = engine
+        try:
+            yield engine
+        finally:
+            session.info.pop('replica', None)
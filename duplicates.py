@@ -0,0 +1,70 @@
+import re
+from collections import defaultdict
+
+from contact_keys import canonical_email, canonical_phone
+
+# Contacts are only compared within blocks that share a normalized key, so detection is one pass
+# over the account plus near-constant work per contact instead of comparing every pair. Email and
+# phone keys are the ones stored for the reverse lookup, so both features agree on what matches.
+
+STATUS_PRIORITY = ['active', 'blocked', 'bin']
+
+
+def normalize_name(name):
+    tokens = sorted(re.findall(r'\w+', (name or '').lower()))
+    # A single first name is too common to be evidence of a duplicate on its own
+    if len(tokens) < 2:
+        return None
+    return ' '.join(tokens)
+
+
+def blocking_keys(name, email, phone):
+    for kind, key in (('email', canonical_email(email)), ('phone', canonical_phone(phone)), ('name', normalize_name(name))):
+        if key:
+            yield kind, key
+
+
+def find_duplicate_groups(rows):
+    # rows: iterable of (id, name, email, phone). Returns [(ids, reasons)] for every group of 2+ contacts.
+    parent = {}
+    first_seen = {}
+    links = []
+
+    def find(id):
+        while parent[id] != id:
+            parent[id] = parent[parent[id]]
+            id = parent[id]
+        return id
+
+    for id, name, email, phone in rows:
+        parent[id] = id
+        for kind, key in blocking_keys(name, email, phone):
+            other = first_seen.setdefault((kind, key), id)
+            if other != id:
+                parent[find(id)] = find(other)
+                links.append((id, kind))
+
+    members = defaultdict(list)
+    for id in parent:
+        members[find(id)].append(id)
+    reasons = defaultdict(set)
+    for id, kind in links:
+        reasons[find(id)].add(kind)
+
+    return [(ids, sorted(reasons[root])) for root, ids in members.items() if len(ids) > 1]
+
+
+def merged_fields(keeper, losers):
+    # The kept contact gains every category, stays a favorite if any duplicate was one,
+    # takes the most "alive" status and fills a missing phone number from the duplicates
+    contacts = [keeper, *losers]
+    categories = []
+    for contact in contacts:
+        categories.extend(category for category in contact.categories or [] if category not in categories)
+    return {
+        'categories': categories,
+        'favorite': any(contact.favorite for contact in contacts),
+        'status': min((contact.status for contact in contacts),
+                      key=lambda status: STATUS_PRIORITY.index(status) if status in STATUS_PRIORITY else len(STATUS_PRIORITY)),
+        'phone': keeper.phone or next((contact.phone for contact in losers if contact.phone), keeper.phone),
+    }
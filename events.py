@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import event
+
+from ids import uuid7
+from models import CONTACT_FIELDS, db
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, user_id, max_queued):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # A client this far behind gets a resync instead of an ever growing backlog
+            self.overflowed = True
+
+
+class EventBus:
+    # Fans contact and activity changes out to the /api/events streams of the same user.
+    #
+    # Events are held on the session and only published once it commits. The backend carries them
+    # to every worker: LocalBackend delivers in-process (one worker), SharedBackend goes through a
+    # pub/sub server. Each worker keeps the last `history` events per user so a reconnecting client
+    # can resume from its Last-Event-ID; when that id is no longer known it is told to resync.
+
+    def __init__(self, backend, history=100, max_users=10000, max_streams=8, max_streams_per_user=3,
+                 max_queued=500, max_events_per_commit=100):
+        self.backend = backend
+        self.history = history
+        self.max_users = max_users
+        self.max_streams = max_streams
+        self.max_streams_per_user = max_streams_per_user
+        self.max_queued = max_queued
+        self.max_events_per_commit = max_events_per_commit
+        self.lock = threading.Lock()
+        self.histories = OrderedDict()
+        self.subscriptions = {}
+        self.streams = 0
+        self.published = 0
+        self.rejected = 0
+        self.overflowed = 0
+        self.dumps = json.dumps
+
+    def init_app(self, app):
+        self.dumps = app.json.dumps
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+
+    def publish(self, user_id, name, data):
+        self.publish_many(user_id, name, [data])
+
+    def publish_many(self, user_id, name, items):
+        if items:
+            db.session.info.setdefault('pending_events', []).append((str(user_id), name, items))
+
+    def publish_contact_changes(self, user_id, changes):
+        updated = [after for before, after in changes if after is not None]
+        self.publish_many(user_id, 'contact.updated', [{field: row[field] for field in CONTACT_FIELDS} for row in updated])
+        self.publish_many(user_id, 'contact.deleted', [{'id': before['id']} for before, after in changes if after is None])
+
+    def publish_activities(self, entries):
+        for entry in entries:
+            self.publish(entry['user_id'], 'activity', {
+                'timestamp': entry['timestamp'],
+                'action': entry['action'],
+                'action_type': entry['action_type'],
+                'contact_name': entry['contact_name'],
+            })
+
+    def _after_commit(self, session):
+        pending = session.info.pop('pending_events', None)
+        if not pending:
+            return
+        counts = {}
+        for user_id, name, items in pending:
+            counts[user_id] = counts.get(user_id, 0) + len(items)
+        resynced = set()
+        for user_id, name, items in pending:
+            if counts[user_id] > self.max_events_per_commit:
+                # Bulk changes (batch edits, imports) become one event telling the client to refetch
+                if user_id not in resynced:
+                    resynced.add(user_id)
+                    self._send(user_id, 'resync', {'reason': 'bulk', 'count': counts[user_id]})
+                continue
+            for data in items:
+                self._send(user_id, name, data)
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop('pending_events', None)
+
+    def _send(self, user_id, name, data):
+        event_id = str(uuid7())
+        try:
+            self.backend.publish(user_id, event_id, self._frame(event_id, name, data))
+            with self.lock:
+                self.published += 1
+        except Exception:
+            # The write already committed; a lost notification only costs the client a resync later
+            logger.exception('Failed to publish %s event for user %s', name, user_id)
+
+    def _frame(self, event_id, name, data):
+        return f'id: {event_id}\nevent: {name}\ndata: {self.dumps(data)}\n\n'
+
+    def deliver(self, user_id, event_id, frame):
+        # Called by the backend for every event, from whichever thread received it
+        with self.lock:
+            history = self.histories.get(user_id)
+            if history is None:
+                history = self.histories[user_id] = deque(maxlen=self.history)
+                if len(self.histories) > self.max_users:
+                    self.histories.popitem(last=False)
+            else:
+                self.histories.move_to_end(user_id)
+            history.append((event_id, frame))
+            for subscription in self.subscriptions.get(user_id, ()):
+                subscription.put(frame)
+
+    def subscribe(self, user_id, last_event_id=None):
+        # Returns the subscription and the frames missed since last_event_id. When that event is no
+        # longer in this worker's history the only frame is a resync, whose id the client resumes from next.
+        self.backend.start(self)
+        user_id = str(user_id)
+        with self.lock:
+            subscriptions = self.subscriptions.get(user_id, [])
+            if self.streams >= self.max_streams or len(subscriptions) >= self.max_streams_per_user:
+                self.rejected += 1
+                raise TooManyStreams()
+            subscription = Subscription(user_id, self.max_queued)
+            self.subscriptions[user_id] = subscriptions + [subscription]
+            self.streams += 1
+
+            missed = []
+            if last_event_id:
+                history = list(self.histories.get(user_id, ()))
+                ids = [event_id for event_id, frame in history]
+                if last_event_id in ids:
+                    missed = [frame for event_id, frame in history[ids.index(last_event_id) + 1:]]
+                else:
+                    missed = [self._resync_frame(user_id, 'gap')]
+        return subscription, missed
+
+    def _resync_frame(self, user_id, reason):
+        # Kept in the history (without fanning out) so resuming from it does not trigger another resync
+        event_id = str(uuid7())
+        frame = self._frame(event_id, 'resync', {'reason': reason})
+        history = self.histories.setdefault(user_id, deque(maxlen=self.history))
+        history.append((event_id, frame))
+        return frame
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            subscriptions = [other for other in self.subscriptions.get(subscription.user_id, ()) if other is not subscription]
+            if subscriptions:
+                self.subscriptions[subscription.user_id] = subscriptions
+            else:
+                self.subscriptions.pop(subscription.user_id, None)
+            self.streams -= 1
+            if subscription.overflowed:
+                self.overflowed += 1
+
+    def stream(self, subscription, missed, heartbeat=15.0, max_seconds=3600.0, retry_ms=3000):
+        # Generator for the streaming response; it holds no app context or database connection
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield f'retry: {retry_ms}\n\n'
+            yield from missed
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # Ends the response; EventSource reconnects by itself with Last-Event-ID
+                    return
+                try:
+                    yield subscription.queue.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                if subscription.overflowed:
+                    with self.lock:
+                        frame = self._resync_frame(subscription.user_id, 'overflow')
+                    yield frame
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': self.backend.name,
+                'streams': self.streams,
+                'users': len(self.subscriptions),
+                'published': self.published,
+                'rejected': self.rejected,
+                'overflowed': self.overflowed,
+            }
+
+
+class LocalBackend:
+    # In-process delivery; only correct with a single worker process
+    name = 'local'
+
+    def __init__(self):
+        self.bus = None
+
+    def start(self, bus):
+        self.bus = bus
+
+    def publish(self, user_id, event_id, frame):
+        if self.bus is not None:
+            self.bus.deliver(user_id, event_id, frame)
+
+
+class SharedBackend:
+    # Wraps any client exposing publish(channel, message) and pubsub(), e.g. redis.Redis. Every worker
+    # listens on one channel from a daemon thread, started lazily so each forked worker gets its own.
+    name = 'shared'
+
+    def __init__(self, client, channel='contacts-events'):
+        self.client = client
+        self.channel = channel
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self, bus):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+                self.pid = os.getpid()
+                pubsub = self.client.pubsub()
+                pubsub.subscribe(self.channel)
+                self.thread = threading.Thread(target=self._run, args=(bus, pubsub), name='event-listener', daemon=True)
+                self.thread.start()
+
+    def publish(self, user_id, event_id, frame):
+        self.client.publish(self.channel, json.dumps([user_id, event_id, frame]))
+
+    def _run(self, bus, pubsub):
+        while True:
+            try:
+                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception:
+                logger.exception('Event listener lost its subscription, retrying')
+                time.sleep(1.0)
+                continue
+            if message and message.get('type') == 'message':
+                bus.deliver(*json.loads(message['data']))
+
+
+class FakePubSubClient:
+    # In-process stand-in for a pub/sub server, for local runs and tests
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.put({'type': 'message', 'channel': channel, 'data': message})
+        return len(subscribers)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        with self.client.lock:
+            self.client.subscribers.setdefault(channel, []).append(self.messages)
+
+    def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def create_event_bus(backend, redis_url=None, **options):
+    if backend == 'fake':
+        return EventBus(SharedBackend(FakePubSubClient()), **options)
+    if backend == 'redis':
+        import redis  # optional dependency, only needed for the shared backend
+        return EventBus(SharedBackend(redis.Redis.from_url(redis_url)), **options)
+    return EventBus(LocalBackend(), **options)
@@ -0,0 +1,24 @@
+# Picked up automatically by gunicorn from the working directory
+import os
+
+# Each open /api/events stream holds a thread, so workers serve requests from a thread pool
+# (EVENTS_MAX_STREAMS in app.py must stay below this thread count)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+
+def post_fork(server, worker):
+    # With --preload the app was built in the master; drop any pooled connections it may have
+    # opened so no socket is shared between processes (close=False leaves the master's alone)
+    if server.cfg.preload_app:
+        from app import app
+        from models import db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Drain queued activity log entries before the worker process goes away
+    from app import activity_writer
+    activity_writer.stop()
@@ -0,0 +1,33 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def _uuid7():
+    # RFC 9562 UUIDv7: 48-bit unix milliseconds, then a 12-bit counter (rand_a) seeded randomly each
+    # millisecond so ids from one process stay strictly increasing, then 62 random bits
+    global _last_ms, _counter
+    ms = time.time_ns() // 1_000_000
+    with _lock:
+        if ms > _last_ms:
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            ms = _last_ms
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted within one millisecond: borrow the next one
+                ms += 1
+                _counter = 0
+        _last_ms = ms
+        counter = _counter
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
+
+
+# Python 3.14+ ships its own
+uuid7 = getattr(uuid, 'uuid7', _uuid7)
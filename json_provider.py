@@ -0,0 +1,44 @@
+import datetime
+import json
+import uuid
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj):
+    # Same output as orjson's native handling, so both encoders produce identical bodies
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(JSONProvider):
+    # UUIDs and datetimes are encoded natively, so views can return raw column values
+    # without a per-row str() / isoformat() pass
+    sort_keys = True
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype='application/json')
+
+    def _dumps_bytes(self, obj):
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            return orjson.dumps(obj, default=_default, option=option)
+        return json.dumps(obj, default=_default, sort_keys=self.sort_keys,
+                          separators=(',', ':')).encode('utf-8')
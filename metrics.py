@@ -0,0 +1,221 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestStats:
+    __slots__ = ('started', 'statements', 'sql_seconds', 'statement_texts', 'profile')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.statement_texts = Counter()
+        self.profile = False
+
+
+class SamplingProfiler:
+    # One daemon thread snapshots the stacks of the request threads currently being profiled
+    # every `interval` seconds via sys._current_frames(); nothing runs while no request is registered.
+
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def start(self):
+        with self.lock:
+            # Started lazily per process so it survives a gunicorn fork
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.samples = {}
+                threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+            self.samples[threading.get_ident()] = Counter()
+        self.wakeup.set()
+
+    def stop(self):
+        with self.lock:
+            samples = self.samples.pop(threading.get_ident(), Counter())
+            if not self.samples:
+                self.wakeup.clear()
+        return samples
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+
+class RequestMetrics:
+    # Per-route latency, SQL statement count and SQL time histograms, exported in the Prometheus
+    # text format by render(). Requests running more than statement_budget statements are logged
+    # with their most repeated statement, which is what an N+1 loop looks like.
+
+    def __init__(self, app=None):
+        self.statement_budget = 25
+        self.profiler = None
+        self.slow_request_seconds = None
+        self.latency = {}
+        self.statements = {}
+        self.sql_time = {}
+        self.over_budget = Counter()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.statement_budget = app.config.get('METRICS_STATEMENT_BUDGET', self.statement_budget)
+        slow_ms = app.config.get('PROFILE_SLOW_REQUESTS_MS')
+        if slow_ms:
+            self.slow_request_seconds = slow_ms / 1000
+            self.profiler = SamplingProfiler(interval=app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        # Teardown runs even when the view or a later after_request hook raised
+        app.teardown_request(self._teardown_request)
+        # Listening on the Engine class covers the primary and every replica bind
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _before_request(self):
+        stats = RequestStats()
+        if self.profiler is not None:
+            self.profiler.start()
+            stats.profile = True
+        _current.set(stats)
+
+    def _after_request(self, response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        samples = self.profiler.stop() if stats.profile else None
+        stats.profile = False
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route)
+        with self.lock:
+            self.latency.setdefault(key + (response.status_code,), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(stats.statements)
+            self.sql_time.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.sql_seconds)
+            if stats.statements > self.statement_budget:
+                self.over_budget[key] += 1
+
+        if stats.statements > self.statement_budget:
+            statement, repeats = stats.statement_texts.most_common(1)[0]
+            self.app.logger.warning(
+                '%s %s ran %d SQL statements (budget %d); most repeated %dx: %s',
+                request.method, route, stats.statements, self.statement_budget, repeats, ' '.join(statement.split())[:300]
+            )
+        if samples and elapsed >= self.slow_request_seconds:
+            top = '\n'.join(f'  {count:5d} {stack}' for stack, count in samples.most_common(5))
+            self.app.logger.warning('Slow request %s %s took %.0fms; top sampled stacks:\n%s',
+                                    request.method, route, elapsed * 1000, top)
+
+        response.headers['Server-Timing'] = (f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} queries", '
+                                             f'app;dur={elapsed * 1000:.1f}')
+        return response
+
+    def _teardown_request(self, exc):
+        stats = _current.get()
+        if stats is not None and stats.profile:
+            self.profiler.stop()
+        _current.set(None)
+
+    def render(self, engines=None):
+        lines = []
+        with self.lock:
+            lines += ['# HELP http_request_duration_seconds Request latency by route.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, route, status), histogram in sorted(self.latency.items()):
+                lines += histogram.lines('http_request_duration_seconds',
+                                         f'method="{method}",route="{route}",status="{status}"')
+            lines += ['# HELP http_request_sql_statements SQL statements executed per request.',
+                      '# TYPE http_request_sql_statements histogram']
+            for (method, route), histogram in sorted(self.statements.items()):
+                lines += histogram.lines('http_request_sql_statements', f'method="{method}",route="{route}"')
+            lines += ['# HELP http_request_sql_seconds Time spent in SQL per request.',
+                      '# TYPE http_request_sql_seconds histogram']
+            for (method, route), histogram in sorted(self.sql_time.items()):
+                lines += histogram.lines('http_request_sql_seconds', f'method="{method}",route="{route}"')
+            lines += ['# HELP http_requests_over_statement_budget_total Requests that exceeded the SQL statement budget.',
+                      '# TYPE http_requests_over_statement_budget_total counter']
+            for (method, route), count in sorted(self.over_budget.items()):
+                lines.append(f'http_requests_over_statement_budget_total{{method="{method}",route="{route}"}} {count}')
+
+        # Checked out == size + overflow means requests are queueing for a connection
+        pool_gauges = [('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'), ('db_pool_overflow', 'overflow')]
+        for name, method in pool_gauges:
+            lines.append(f'# TYPE {name} gauge')
+            for bind, engine in sorted((engines or {}).items(), key=lambda item: str(item[0])):
+                value = getattr(engine.pool, method, None)
+                if callable(value):
+                    lines.append(f'{name}{{bind="{bind or "primary"}"}} {value()}')
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None and conn.info.get('query_started'):
+        stats.sql_seconds += time.perf_counter() - conn.info['query_started'].pop()
+        stats.statements += 1
+        stats.statement_texts[statement] += 1
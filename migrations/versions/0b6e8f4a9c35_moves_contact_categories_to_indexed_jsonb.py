@@ -0,0 +1,63 @@
+"""moves contact categories to an indexed jsonb column
+
+Revision ID: 0b6e8f4a9c35
+Revises: f2a9d3c6b8e7
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e8f4a9c35'
+down_revision = 'f2a9d3c6b8e7'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    # Other databases keep the generic JSON column; only Postgres has jsonb and GIN
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.add_column('contacts', sa.Column('categories_jsonb', postgresql.JSONB(), nullable=True))
+
+    # Backfill in committed batches instead of one table-rewriting ALTER ... TYPE. The batches walk the
+    # primary key (categories_jsonb IS NULL has no index, so re-selecting by it would rescan every time)
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            upper = connection.execute(sa.text(
+                # The last id of the next batch (Postgres has no max() over uuid)
+                "SELECT id FROM (SELECT id FROM contacts "
+                + ("WHERE id > :last_id " if last_id is not None else "")
+                + "ORDER BY id LIMIT :batch_size) AS batch ORDER BY id DESC LIMIT 1"
+            ), {'last_id': last_id, 'batch_size': BATCH_SIZE}).scalar()
+            if upper is None:
+                break
+            connection.execute(sa.text(
+                "UPDATE contacts SET categories_jsonb = COALESCE(categories::jsonb, '[]'::jsonb) "
+                "WHERE id <= :upper " + ("AND id > :last_id" if last_id is not None else "")
+            ), {'last_id': last_id, 'upper': upper})
+            last_id = upper
+
+    # Catch rows written while the batches ran, then swap the columns
+    op.execute("UPDATE contacts SET categories_jsonb = COALESCE(categories::jsonb, '[]'::jsonb) "
+               "WHERE categories_jsonb IS NULL")
+    op.drop_column('contacts', 'categories')
+    op.alter_column('contacts', 'categories_jsonb', new_column_name='categories')
+    op.create_index('ix_contacts_categories', 'contacts', ['categories'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'categories': 'jsonb_path_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_contacts_categories', table_name='contacts')
+    op.alter_column('contacts', 'categories', type_=sa.JSON(), postgresql_using='categories::json')
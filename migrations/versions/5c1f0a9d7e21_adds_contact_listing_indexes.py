@@ -0,0 +1,30 @@
+"""adds composite indexes for keyset paginated contact listing
+
+Revision ID: 5c1f0a9d7e21
+Revises: 2e729e6b4d5f
+Create Date: 2026-10-18 07:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0a9d7e21'
+down_revision = '2e729e6b4d5f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.create_index('ix_contacts_user_id_created_at_id', ['user_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_contacts_user_id_status_created_at_id', ['user_id', 'status', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_contacts_user_id_favorite_created_at_id', ['user_id', 'favorite', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_favorite_created_at_id')
+        batch_op.drop_index('ix_contacts_user_id_status_created_at_id')
+        batch_op.drop_index('ix_contacts_user_id_created_at_id')
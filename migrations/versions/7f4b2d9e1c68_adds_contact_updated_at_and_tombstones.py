@@ -0,0 +1,70 @@
+"""adds contact updated_at and deletion tombstones for delta sync
+
+Revision ID: 7f4b2d9e1c68
+Revises: 3d8c1e7f5a92
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f4b2d9e1c68'
+down_revision = '3d8c1e7f5a92'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing contacts were last changed no later than they were created, as far as sync is concerned.
+    # Batches walk the primary key: updated_at IS NULL has no index to find the next batch with.
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            upper = connection.execute(sa.text(
+                # The last id of the next batch (Postgres has no max() over uuid)
+                "SELECT id FROM (SELECT id FROM contacts "
+                + ("WHERE id > :last_id " if last_id is not None else "")
+                + "ORDER BY id LIMIT :batch_size) AS batch ORDER BY id DESC LIMIT 1"
+            ), {'last_id': last_id, 'batch_size': BATCH_SIZE}).scalar()
+            if upper is None:
+                break
+            connection.execute(sa.text(
+                "UPDATE contacts SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+                "WHERE id <= :upper " + ("AND id > :last_id" if last_id is not None else "")
+            ), {'last_id': last_id, 'upper': upper})
+            last_id = upper
+
+    op.execute("UPDATE contacts SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_contacts_user_id_updated_at_id', ['user_id', 'updated_at', 'id'], unique=False)
+
+    op.create_table('contact_tombstones',
+    sa.Column('contact_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('contact_id')
+    )
+    with op.batch_alter_table('contact_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_contact_tombstones_user_id_deleted_at_contact_id',
+                              ['user_id', 'deleted_at', 'contact_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_contact_tombstones_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('contact_tombstones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_contact_tombstones_deleted_at'))
+        batch_op.drop_index('ix_contact_tombstones_user_id_deleted_at_contact_id')
+
+    op.drop_table('contact_tombstones')
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_updated_at_id')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,39 @@
+"""adds trigram indexes for contact typeahead search
+
+Revision ID: 8a3d6e4b2c10
+Revises: 5c1f0a9d7e21
+Create Date: 2026-10-18 07:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3d6e4b2c10'
+down_revision = '5c1f0a9d7e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm only exists on Postgres; other databases use the in-process index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_contacts_name_trgm ON contacts USING gin (lower(name) gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_contacts_email_trgm ON contacts USING gin (lower(email) gin_trgm_ops)")
+    op.execute(
+        "CREATE INDEX ix_contacts_phone_digits_trgm ON contacts "
+        "USING gin (regexp_replace(phone, '[^0-9]', '', 'g') gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_contacts_phone_digits_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_contacts_email_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_contacts_name_trgm")
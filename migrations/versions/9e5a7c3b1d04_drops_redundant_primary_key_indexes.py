@@ -0,0 +1,42 @@
+"""drops ix_*_id indexes that duplicate the primary key indexes
+
+Revision ID: 9e5a7c3b1d04
+Revises: 7f4b2d9e1c68
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e5a7c3b1d04'
+down_revision = '7f4b2d9e1c68'
+branch_labels = None
+depends_on = None
+
+# Each of these sits on the same single column as the table's primary key index
+REDUNDANT_INDEXES = [
+    ('users', 'ix_users_id'),
+    ('contacts', 'ix_contacts_id'),
+    ('activity_log', 'ix_activity_log_id'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY keeps writes flowing on the big tables; it cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            for _, name in REDUNDANT_INDEXES:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        return
+
+    for table, name in REDUNDANT_INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
+
+
+def downgrade():
+    for table, name in REDUNDANT_INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, ['id'], unique=False)
@@ -0,0 +1,56 @@
+"""adds normalized email / phone columns for reverse lookup
+
+Revision ID: a6c4e2f80b17
+Revises: 9e5a7c3b1d04
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from contact_keys import canonical_email, canonical_phone
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c4e2f80b17'
+down_revision = '9e5a7c3b1d04'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    op.add_column('contacts', sa.Column('email_normalized', sa.String(length=120), nullable=True))
+    op.add_column('contacts', sa.Column('phone_normalized', sa.String(length=20), nullable=True))
+
+    # The E.164 rules live in Python, so rows are read and written back in committed keyset batches
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            rows = connection.execute(sa.text(
+                "SELECT id, email, phone FROM contacts "
+                + ("WHERE id > :last_id " if last_id is not None else "")
+                + "ORDER BY id LIMIT :batch_size"
+            ), {'last_id': last_id, 'batch_size': BATCH_SIZE}).all()
+            if not rows:
+                break
+            connection.execute(sa.text(
+                "UPDATE contacts SET email_normalized = :email_normalized, phone_normalized = :phone_normalized "
+                "WHERE id = :id"
+            ), [{'id': row.id, 'email_normalized': canonical_email(row.email),
+                 'phone_normalized': canonical_phone(row.phone)} for row in rows])
+            last_id = rows[-1].id
+
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.create_index('ix_contacts_user_id_email_normalized', ['user_id', 'email_normalized'], unique=False)
+        batch_op.create_index('ix_contacts_user_id_phone_normalized', ['user_id', 'phone_normalized'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_phone_normalized')
+        batch_op.drop_index('ix_contacts_user_id_email_normalized')
+        batch_op.drop_column('phone_normalized')
+        batch_op.drop_column('email_normalized')
@@ -0,0 +1,105 @@
+"""adds contact binned_at and partial indexes that leave binned contacts out
+
+Revision ID: b8d2f6a4c913
+Revises: a6c4e2f80b17
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2f6a4c913'
+down_revision = 'a6c4e2f80b17'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+LIVE = "status <> 'bin'"
+BINNED = "status = 'bin'"
+
+# (full index replaced, partial index replacing it, columns)
+REPLACED_INDEXES = [
+    ('ix_contacts_user_id_created_at_id', 'ix_contacts_live_user_id_created_at_id', ['user_id', 'created_at', 'id']),
+    ('ix_contacts_user_id_favorite_created_at_id', 'ix_contacts_live_user_id_favorite_created_at_id',
+     ['user_id', 'favorite', 'created_at', 'id']),
+    ('ix_contacts_user_id_email_normalized', 'ix_contacts_live_user_id_email_normalized', ['user_id', 'email_normalized']),
+    ('ix_contacts_user_id_phone_normalized', 'ix_contacts_live_user_id_phone_normalized', ['user_id', 'phone_normalized']),
+]
+BIN_INDEXES = [
+    ('ix_contacts_bin_user_id_binned_at_id', ['user_id', 'binned_at', 'id']),
+    ('ix_contacts_bin_binned_at_id', ['binned_at', 'id']),
+]
+# Postgres only, see 8a3d6e4b2c10: (old name, new name, indexed expression)
+TRIGRAM_INDEXES = [
+    ('ix_contacts_name_trgm', 'ix_contacts_live_name_trgm', "lower(name) gin_trgm_ops"),
+    ('ix_contacts_email_trgm', 'ix_contacts_live_email_trgm', "lower(email) gin_trgm_ops"),
+    ('ix_contacts_phone_digits_trgm', 'ix_contacts_live_phone_digits_trgm',
+     "regexp_replace(phone, '[^0-9]', '', 'g') gin_trgm_ops"),
+]
+
+
+def upgrade():
+    op.add_column('contacts', sa.Column('binned_at', sa.DateTime(), nullable=True))
+
+    # When a contact was binned was never recorded; its last change is the closest (and never early) guess.
+    # Batches walk the primary key: binned_at IS NULL has no index to find the next batch with.
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            upper = connection.execute(sa.text(
+                # The last id of the next batch (Postgres has no max() over uuid)
+                f"SELECT id FROM (SELECT id FROM contacts WHERE {BINNED} "
+                + ("AND id > :last_id " if last_id is not None else "")
+                + "ORDER BY id LIMIT :batch_size) AS batch ORDER BY id DESC LIMIT 1"
+            ), {'last_id': last_id, 'batch_size': BATCH_SIZE}).scalar()
+            if upper is None:
+                break
+            connection.execute(sa.text(
+                f"UPDATE contacts SET binned_at = updated_at WHERE {BINNED} AND id <= :upper "
+                + ("AND id > :last_id" if last_id is not None else "")
+            ), {'last_id': last_id, 'upper': upper})
+            last_id = upper
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY keeps writes flowing on contacts; the new indexes exist before the old ones go
+        with op.get_context().autocommit_block():
+            for old, new, columns in REPLACED_INDEXES:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {new} ON contacts ({', '.join(columns)}) WHERE {LIVE}")
+            for name, columns in BIN_INDEXES:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON contacts ({', '.join(columns)}) WHERE {BINNED}")
+            for old, new, expression in TRIGRAM_INDEXES:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {new} ON contacts USING gin ({expression}) WHERE {LIVE}")
+            for old, new, _ in REPLACED_INDEXES + TRIGRAM_INDEXES:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {old}")
+        return
+
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        for old, new, columns in REPLACED_INDEXES:
+            batch_op.create_index(new, columns, unique=False, sqlite_where=sa.text(LIVE))
+            batch_op.drop_index(old)
+        for name, columns in BIN_INDEXES:
+            batch_op.create_index(name, columns, unique=False, sqlite_where=sa.text(BINNED))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for old, new, columns in REPLACED_INDEXES:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {old} ON contacts ({', '.join(columns)})")
+            for old, new, expression in TRIGRAM_INDEXES:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {old} ON contacts USING gin ({expression})")
+            for name in [new for _, new, _ in REPLACED_INDEXES + TRIGRAM_INDEXES] + [name for name, _ in BIN_INDEXES]:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        op.drop_column('contacts', 'binned_at')
+        return
+
+    with op.batch_alter_table('contacts', schema=None) as batch_op:
+        for name, _ in reversed(BIN_INDEXES):
+            batch_op.drop_index(name)
+        for old, new, columns in reversed(REPLACED_INDEXES):
+            batch_op.create_index(old, columns, unique=False)
+            batch_op.drop_index(new)
+        batch_op.drop_column('binned_at')
@@ -0,0 +1,28 @@
+"""adds per-user data version for conditional GETs
+
+Revision ID: c7e2b5a81f43
+Revises: 8a3d6e4b2c10
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2b5a81f43'
+down_revision = '8a3d6e4b2c10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('data_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('data_updated_at')
+        batch_op.drop_column('data_version')
@@ -0,0 +1,47 @@
+"""adds activity feed indexes and daily activity rollup table
+
+Revision ID: e41b7c09d6a2
+Revises: c7e2b5a81f43
+Create Date: 2026-10-18 08:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7c09d6a2'
+down_revision = 'c7e2b5a81f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity_log', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_log_user_id_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_activity_log_timestamp', ['timestamp'], unique=False)
+
+    op.create_table('activity_daily_counts',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'action')
+    )
+
+    # Seed the rollup from the existing history; new rows are added as activity is written
+    day = "timestamp::date" if op.get_bind().dialect.name == 'postgresql' else "date(timestamp)"
+    op.execute(
+        "INSERT INTO activity_daily_counts (user_id, day, action, total) "
+        f"SELECT user_id, {day}, action, count(*) FROM activity_log "
+        f"WHERE timestamp IS NOT NULL GROUP BY user_id, {day}, action"
+    )
+
+
+def downgrade():
+    op.drop_table('activity_daily_counts')
+
+    with op.batch_alter_table('activity_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_log_timestamp')
+        batch_op.drop_index('ix_activity_log_user_id_timestamp_id')
@@ -0,0 +1,45 @@
+"""adds per-user contact stats counters
+
+Revision ID: f2a9d3c6b8e7
+Revises: e41b7c09d6a2
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9d3c6b8e7'
+down_revision = 'e41b7c09d6a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('contact_stats',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('bucket', sa.String(length=150), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'bucket')
+    )
+
+    # Same GROUP BY queries as `flask rebuild-contact-stats`
+    if op.get_bind().dialect.name == 'postgresql':
+        categories = "CROSS JOIN LATERAL jsonb_array_elements_text(contacts.categories::jsonb) AS category(value)"
+    else:
+        categories = "JOIN json_each(contacts.categories) AS category"
+    op.execute("INSERT INTO contact_stats (user_id, bucket, total) "
+               "SELECT user_id, 'total', count(*) FROM contacts GROUP BY user_id")
+    op.execute("INSERT INTO contact_stats (user_id, bucket, total) "
+               "SELECT user_id, 'favorite', count(*) FROM contacts WHERE favorite GROUP BY user_id")
+    op.execute("INSERT INTO contact_stats (user_id, bucket, total) "
+               "SELECT user_id, 'status:' || status, count(*) FROM contacts GROUP BY user_id, status")
+    op.execute("INSERT INTO contact_stats (user_id, bucket, total) "
+               "SELECT contacts.user_id, 'category:' || category.value, count(DISTINCT contacts.id) "
+               f"FROM contacts {categories} GROUP BY contacts.user_id, category.value")
+
+
+def downgrade():
+    op.drop_table('contact_stats')
@@ -1,30 +1,41 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from passwords import PasswordHasher
+from db_routing import RoutingSession
+from ids import uuid7
+from contact_keys import canonical_email, canonical_phone, default_from
 import uuid
 from datetime import datetime
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+password_hasher = PasswordHasher()
 
 
 class Users(db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)  # Indexed for faster lookups
     password_hash = db.Column(db.String(255), nullable=True)  # Nullable for OAuth users
     oauth_provider = db.Column(db.String(50), nullable=True)  # 'google', 'github', etc.
     oauth_id = db.Column(db.String(255), unique=True, nullable=True)  # Unique OAuth user ID
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped by every contact/activity write; conditional GETs compare against it instead of re-querying
+    data_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    data_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     contacts = db.relationship('Contacts', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return bool(self.password_hash) and password_hasher.needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
@@ -36,22 +47,63 @@ class Users(db.Model):
         }
 
 
+def partial_index(name, *columns, where):
+    return db.Index(name, *columns, postgresql_where=db.text(where), sqlite_where=db.text(where))
+
+
+# Binned contacts are left out of the indexes behind the everyday read paths. Queries have to
+# repeat the predicate as a literal (see LIVE_CONTACT / BINNED_CONTACT) for the planner to use them.
+LIVE_PREDICATE = "status <> 'bin'"
+BINNED_PREDICATE = "status = 'bin'"
+
+
+def _binned_at_default(context):
+    return datetime.utcnow() if context.get_current_parameters().get('status') == 'bin' else None
+
+
 class Contacts(db.Model):
     __tablename__ = 'contacts'
-
-    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    __table_args__ = (
+        # Keyset pagination indexes: every listing page is a seek on (user_id, [filter], created_at, id)
+        partial_index('ix_contacts_live_user_id_created_at_id', 'user_id', 'created_at', 'id', where=LIVE_PREDICATE),
+        db.Index('ix_contacts_user_id_status_created_at_id', 'user_id', 'status', 'created_at', 'id'),
+        partial_index('ix_contacts_live_user_id_favorite_created_at_id', 'user_id', 'favorite', 'created_at', 'id',
+                      where=LIVE_PREDICATE),
+        # Delta sync seeks on (user_id, updated_at, id)
+        db.Index('ix_contacts_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+        # Reverse lookup (caller ID, mail ingest) by normalized email / phone
+        partial_index('ix_contacts_live_user_id_email_normalized', 'user_id', 'email_normalized', where=LIVE_PREDICATE),
+        partial_index('ix_contacts_live_user_id_phone_normalized', 'user_id', 'phone_normalized', where=LIVE_PREDICATE),
+        # Emptying one user's bin, and the expiry purge across all users, oldest first
+        partial_index('ix_contacts_bin_user_id_binned_at_id', 'user_id', 'binned_at', 'id', where=BINNED_PREDICATE),
+        partial_index('ix_contacts_bin_binned_at_id', 'binned_at', 'id', where=BINNED_PREDICATE),
+        # Containment (@>) lookups for category filters and renames
+        db.Index('ix_contacts_categories', 'categories', postgresql_using='gin',
+                 postgresql_ops={'categories': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
-    categories = db.Column(db.JSON, default=[]) 
+    email_normalized = db.Column(db.String(120), default=default_from('email', canonical_email))
+    phone_normalized = db.Column(db.String(20), default=default_from('phone', canonical_phone))
+    categories = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), default=[])
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     status = db.Column(db.String(20), default='active', nullable=False)
     favorite = db.Column(db.Boolean, default=False, nullable=False)
+    # When the contact went to the bin; it is purged BIN_RETENTION_DAYS later
+    binned_at = db.Column(db.DateTime, default=_binned_at_default)
     
     user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False, index=True)  # Indexed for better performance
 
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        # fields limits the output to a sparse fieldset and only touches those attributes,
+        # so a load_only() query never lazy-loads the columns it skipped
+        if fields is not None:
+            return {field: _json_value(getattr(self, field)) for field in fields}
         return {
             "id": str(self.id),
             "name": self.name,
@@ -59,16 +111,51 @@ class Contacts(db.Model):
             "phone": self.phone,
             "categories": self.categories,
             "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "status": self.status,
             "favorite": self.favorite,
+            "binned_at": self.binned_at.isoformat() if self.binned_at else None,
             "user_id": str(self.user_id)
         }
 
 
+CONTACT_FIELDS = ('id', 'name', 'email', 'phone', 'categories', 'created_at', 'updated_at', 'status', 'favorite',
+                  'binned_at', 'user_id')
+
+
+LIVE_CONTACT = Contacts.status != db.literal_column("'bin'")
+BINNED_CONTACT = Contacts.status == db.literal_column("'bin'")
+
+
+def _json_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# Left behind by every contact delete so sync clients can learn about removals incrementally
+class ContactTombstone(db.Model):
+    __tablename__ = 'contact_tombstones'
+    __table_args__ = (
+        db.Index('ix_contact_tombstones_user_id_deleted_at_contact_id', 'user_id', 'deleted_at', 'contact_id'),
+    )
+
+    contact_id = db.Column(db.UUID(as_uuid=True), primary_key=True)
+    user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 class ActivityLog(db.Model):
     __tablename__ = 'activity_log'
+    __table_args__ = (
+        # Feed pagination seeks on (user_id, timestamp, id); retention prunes by timestamp alone
+        db.Index('ix_activity_log_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_activity_log_timestamp', 'timestamp'),
+    )
 
-    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False, index=True)  # Indexed for better performance
     action = db.Column(db.String(50), nullable=False)
     action_type = db.Column(db.String(50), nullable=False)
@@ -84,4 +171,50 @@ class ActivityLog(db.Model):
             "action": self.action,
             "timestamp": self.timestamp.isoformat(),
             "contact_name": self.contact_name
-        }
\ No newline at end of file
+        }
+
+
+class ActivityDailyCount(db.Model):
+    __tablename__ = 'activity_daily_counts'
+
+    # Maintained incrementally as activity rows are written, and kept when old rows are pruned
+    user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+
+    def to_dict(self):
+        return {
+            "day": self.day.isoformat(),
+            "action": self.action,
+            "count": self.total
+        }
+
+
+class ContactStat(db.Model):
+    __tablename__ = 'contact_stats'
+
+    # One counter row per user and bucket: 'total', 'favorite', 'status:<status>' or 'category:<name>'.
+    # Updated in the same transaction as the contact write; rebuilt by `flask rebuild-contact-stats`.
+    user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('users.id'), primary_key=True)
+    bucket = db.Column(db.String(150), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # Append-only log of logged-out JWTs; workers tail it by id into their in-process store
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+def increment_upsert(table, keys, column):
+    # INSERT ... ON CONFLICT (keys) DO UPDATE SET column = column + excluded.column
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: table.c[column] + statement.excluded[column]}
+    )
@@ -0,0 +1,37 @@
+import threading
+
+from flask import current_app
+
+_blueprint = None
+_lock = threading.Lock()
+
+
+def google_blueprint(app):
+    # flask_dance (and requests-oauthlib behind it) is imported the first time someone starts the OAuth flow
+    global _blueprint
+    with _lock:
+        if _blueprint is None:
+            from flask_dance.contrib.google import make_google_blueprint
+            _blueprint = make_google_blueprint(
+                client_id=app.config.get("GOOGLE_CLIENT_ID"),
+                client_secret=app.config.get("GOOGLE_CLIENT_SECRET"),
+                redirect_to="api.google_auth"
+            )
+    return _blueprint
+
+
+def _lazy_view(name):
+    def view():
+        blueprint = google_blueprint(current_app)
+        # What the registered blueprint's before_app_request hook would have done
+        blueprint.load_config()
+        return getattr(blueprint, name)()
+    view.__name__ = f'google_{name}'
+    return view
+
+
+def init_google_login(app):
+    # Same URLs and endpoint names as app.register_blueprint(google_bp, url_prefix="/login"),
+    # so url_for('google.login') and the blueprint's own redirects keep working
+    app.add_url_rule('/login/google', endpoint='google.login', view_func=_lazy_view('login'))
+    app.add_url_rule('/login/google/authorized', endpoint='google.authorized', view_func=_lazy_view('authorized'))
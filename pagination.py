@@ -0,0 +1,61 @@
+import base64
+import datetime
+import json
+import uuid
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size(value):
+    # Clamp the requested limit so a single page can never turn back into a full table dump
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+
+def encode_cursor(timestamp, id):
+    payload = json.dumps([timestamp.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.datetime.fromisoformat(timestamp), uuid.UUID(id)
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor(cursor)
+
+
+def parse_bool(value):
+    if value is None:
+        return None
+    value = value.lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise ValueError(value)
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value)
+
+
+def parse_fields(value, allowed):
+    # ?fields=id,name,favorite -> ['id', 'name', 'favorite']; None means every field
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return list(dict.fromkeys(fields))
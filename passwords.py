@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password_hash, password):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+class PasswordHasher:
+    # Runs bcrypt on a small process pool instead of the request thread. At most max_pending
+    # hashes may be queued or running per worker; beyond that callers get PasswordHasherBusy
+    # (served as 503) right away instead of piling up behind a login storm.
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 2
+        self.max_pending = 8
+        self.timeout = 10.0
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def _run(self, function, *args):
+        slots = self.slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        executor = self._executor()
+        try:
+            future = executor.submit(function, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._replace(executor)
+            raise PasswordHasherBusy()
+        except BaseException:
+            slots.release()
+            raise
+        # A job that has started cannot be cancelled, so its slot is only freed once it really finishes
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordHasherBusy()
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); the pool refuses all further work until replaced
+            self._replace(executor)
+            raise PasswordHasherBusy()
+
+    def _replace(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _executor(self):
+        # Created lazily and per process, so a pool started before a gunicorn fork is never reused
+        if self.executor is None or self.pid != os.getpid():
+            with self.lock:
+                if self.executor is None or self.pid != os.getpid():
+                    self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self.pid = os.getpid()
+        return self.executor
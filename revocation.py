@@ -0,0 +1,181 @@
+import bisect
+import datetime
+import hashlib
+import threading
+import time
+
+from sqlalchemy import delete, insert, or_, select
+
+from models import RevokedToken, db
+
+BUCKET_SECONDS = 60
+# How long an id skipped by the tail is re-read in case its transaction commits late, and how many are kept
+GAP_SECONDS = 300
+MAX_GAPS = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity=100000, hashes=4):
+        self.size = capacity * 10
+        self.hashes = hashes
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=4 * self.hashes).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], 'little') % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def might_contain(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+class RevocationStore:
+    # In-process set of revoked jtis. Entries are grouped in buckets by the minute their token
+    # expires, so expired revocations are dropped a whole bucket at a time. Lookups never leave
+    # the process; revocations made by other workers arrive through backend.since() every sync_interval.
+
+    def __init__(self, backend, sync_interval=1.0, bloom=False):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.use_bloom = bloom
+        self.lock = threading.Lock()
+        self.expiry = {}
+        self.buckets = {}
+        self.bloom = BloomFilter() if bloom else None
+        self.cursor = None
+        self.last_sync = 0.0
+
+    def revoke(self, jti, expires_at):
+        self.backend.add(jti, expires_at)
+        self._add(jti, expires_at)
+
+    def is_revoked(self, jti):
+        now = time.time()
+        if now - self.last_sync >= self.sync_interval:
+            self._sync(now)
+        if self.bloom is not None and not self.bloom.might_contain(jti):
+            return False
+        expires_at = self.expiry.get(jti)
+        return expires_at is not None and expires_at > now
+
+    def _add(self, jti, expires_at):
+        with self.lock:
+            self.expiry[jti] = expires_at
+            self.buckets.setdefault(int(expires_at // BUCKET_SECONDS), set()).add(jti)
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def _sync(self, now):
+        with self.lock:
+            if now - self.last_sync < self.sync_interval:
+                return
+            self.last_sync = now
+        entries, self.cursor = self.backend.since(self.cursor)
+        for jti, expires_at in entries:
+            self._add(jti, expires_at)
+        self._sweep(now)
+
+    def _sweep(self, now):
+        current = int(now // BUCKET_SECONDS)
+        with self.lock:
+            expired = [bucket for bucket in self.buckets if bucket < current]
+            for bucket in expired:
+                for jti in self.buckets.pop(bucket):
+                    self.expiry.pop(jti, None)
+            if expired and self.bloom is not None:
+                # Bloom filters cannot forget, so rebuild from what is left. is_revoked reads self.bloom
+                # without the lock, so the new filter is only published once it is complete.
+                bloom = BloomFilter()
+                for jti in self.expiry:
+                    bloom.add(jti)
+                self.bloom = bloom
+
+
+class MemoryRevocationBackend:
+    # Single-process backend; also the local stand-in for a shared backend in tests. Entries carry a
+    # sequence number as the cursor, so expired ones can be dropped without shifting anyone's position.
+    def __init__(self):
+        self.entries = []
+        self.sequence = 0
+        self.next_prune = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        with self.lock:
+            self.sequence += 1
+            self.entries.append((self.sequence, jti, expires_at))
+        # Nothing else prunes this backend inside a long-running process
+        if time.time() >= self.next_prune:
+            self.prune()
+
+    def since(self, cursor):
+        with self.lock:
+            cursor = cursor or 0
+            start = bisect.bisect_right(self.entries, cursor, key=lambda entry: entry[0])
+            return [(jti, expires_at) for sequence, jti, expires_at in self.entries[start:]], self.sequence
+
+    def prune(self):
+        now = time.time()
+        with self.lock:
+            self.next_prune = now + BUCKET_SECONDS
+            live = [entry for entry in self.entries if entry[2] > now]
+            pruned = len(self.entries) - len(live)
+            self.entries = live
+        return pruned
+
+
+class DatabaseRevocationBackend:
+    # Shares revocations between workers through the revoked_tokens table
+    def add(self, jti, expires_at):
+        db.session.execute(insert(RevokedToken).values(
+            jti=jti,
+            expires_at=datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc).replace(tzinfo=None)
+        ))
+        db.session.commit()
+
+    def since(self, cursor):
+        # The cursor is (highest id seen, {skipped id: when it was first skipped}). Ids come from a
+        # sequence at INSERT time, so a lower id can commit after a higher one has been read; skipped
+        # ids are re-read on every sync until they show up or GAP_SECONDS pass (rollbacks leave holes too).
+        now = time.monotonic()
+        if cursor is None:
+            # First sync: only revocations that can still matter
+            last_id, gaps = None, {}
+            query = select(RevokedToken).where(RevokedToken.expires_at > datetime.datetime.utcnow())
+        else:
+            last_id, gaps = cursor
+            gaps = {id: skipped for id, skipped in gaps.items() if now - skipped < GAP_SECONDS}
+            condition = RevokedToken.id > last_id
+            if gaps:
+                condition = or_(condition, RevokedToken.id.in_(gaps))
+            query = select(RevokedToken).where(condition)
+        rows = db.session.scalars(query.order_by(RevokedToken.id)).all()
+
+        if last_id is None:
+            last_id = rows[-1].id if rows else db.session.scalar(select(db.func.max(RevokedToken.id))) or 0
+        else:
+            read = {row.id for row in rows}
+            for id in read:
+                gaps.pop(id, None)
+            newest = max(read | {last_id})
+            gaps.update((id, now) for id in range(max(last_id + 1, newest - MAX_GAPS), newest) if id not in read)
+            if len(gaps) > MAX_GAPS:
+                gaps = dict(sorted(gaps.items())[-MAX_GAPS:])
+            last_id = newest
+        entries = [(row.jti, row.expires_at.replace(tzinfo=datetime.timezone.utc).timestamp()) for row in rows]
+        return entries, (last_id, gaps)
+
+    def prune(self):
+        result = db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.datetime.utcnow()))
+        db.session.commit()
+        return result.rowcount
+
+
+def create_revocation_store(backend, sync_interval, bloom):
+    if backend == 'memory':
+        return RevocationStore(MemoryRevocationBackend(), sync_interval=sync_interval, bloom=bloom)
+    return RevocationStore(DatabaseRevocationBackend(), sync_interval=sync_interval, bloom=bloom)
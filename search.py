@@ -0,0 +1,126 @@
+import bisect
+import difflib
+import re
+import threading
+
+from sqlalchemy import case, func, or_
+
+from models import LIVE_CONTACT, Contacts, db
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+FUZZY_CUTOFF = 0.6
+
+# Postgres answers searches from the pg_trgm indexes created in migration 8a3d6e4b2c10 (partial on
+# live contacts since b8d2f6a4c913). Binned contacts are never returned.
+# Other databases (SQLite in local runs) fall back to an in-process prefix index per user.
+_indexes = {}
+_lock = threading.Lock()
+
+
+def digits_only(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def search_contacts(user_id, q, limit=DEFAULT_LIMIT):
+    q = q.strip().lower()
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgres(user_id, q, limit)
+    return _search_prefix_index(user_id, q, limit)
+
+
+def invalidate(user_id):
+    # Called by every route that changes a contact's name, email, phone or bin status
+    with _lock:
+        _indexes.pop(str(user_id), None)
+
+
+def _search_postgres(user_id, q, limit):
+    name = func.lower(Contacts.name)
+    email = func.lower(Contacts.email)
+    # Must match the expression indexed by ix_contacts_phone_digits_trgm
+    phone = func.regexp_replace(Contacts.phone, '[^0-9]', '', 'g')
+    digits = digits_only(q)
+
+    prefix_match = [name.startswith(q, autoescape=True), email.startswith(q, autoescape=True)]
+    if digits:
+        prefix_match.append(phone.startswith(digits, autoescape=True))
+
+    rank = case(
+        (name.startswith(q, autoescape=True), 3),
+        (or_(*prefix_match[1:]), 2),
+        (name.contains(q, autoescape=True), 1),
+        else_=0
+    ) + func.similarity(name, q)
+
+    return (
+        Contacts.query
+        .filter(Contacts.user_id == user_id, LIVE_CONTACT)
+        .filter(or_(*prefix_match, name.contains(q, autoescape=True), name.op('%')(q)))
+        .order_by(rank.desc(), Contacts.name)
+        .limit(limit)
+        .all()
+    )
+
+
+def _search_prefix_index(user_id, q, limit):
+    key = str(user_id)
+    with _lock:
+        index = _indexes.get(key)
+    if index is None:
+        rows = db.session.query(Contacts.id, Contacts.name, Contacts.email, Contacts.phone) \
+            .filter(Contacts.user_id == user_id, LIVE_CONTACT).all()
+        index = PrefixIndex(rows)
+        with _lock:
+            _indexes[key] = index
+
+    ids = index.search(q, limit)
+    if not ids:
+        return []
+    contacts = {c.id: c for c in Contacts.query.filter(Contacts.user_id == user_id, LIVE_CONTACT, Contacts.id.in_(ids))}
+    return [contacts[id] for id in ids if id in contacts]
+
+
+class PrefixIndex:
+    def __init__(self, rows):
+        entries = []
+        self.names = {}
+        for id, name, email, phone in rows:
+            name = (name or '').lower()
+            self.names[id] = name
+            entries.append((name, 3, id))
+            for word in name.split():
+                entries.append((word, 1, id))
+            if email:
+                entries.append((email.lower(), 2, id))
+            if digits_only(phone):
+                entries.append((digits_only(phone), 2, id))
+        entries.sort(key=lambda entry: entry[0])
+        self.terms = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def search(self, q, limit):
+        scores = {}
+        self._match_prefix(q, scores)
+        digits = digits_only(q)
+        if digits and digits != q:
+            self._match_prefix(digits, scores)
+
+        if len(scores) < limit:
+            # Fuzzy matching only runs when prefixes could not fill the page
+            for term in difflib.get_close_matches(q, set(self.terms), n=limit, cutoff=FUZZY_CUTOFF):
+                ratio = difflib.SequenceMatcher(None, q, term).ratio()
+                start = bisect.bisect_left(self.terms, term)
+                for position in range(start, bisect.bisect_right(self.terms, term)):
+                    id = self.entries[position][2]
+                    scores[id] = max(scores.get(id, 0), ratio)
+
+        ranked = sorted(scores, key=lambda id: (-scores[id], self.names[id]))
+        return ranked[:limit]
+
+    def _match_prefix(self, prefix, scores):
+        position = bisect.bisect_left(self.terms, prefix)
+        while position < len(self.terms) and self.terms[position].startswith(prefix):
+            _, weight, id = self.entries[position]
+            scores[id] = max(scores.get(id, 0), weight + 1)
+            position += 1
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read by the module-level singletons in app.py, so they must be set before it is imported
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-long-enough-for-hs256-signing')
+os.environ.setdefault('ACTIVITY_LOG_MODE', 'sync')
+os.environ.setdefault('CACHE_BACKEND', 'none')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+
+@pytest.fixture
+def replica_urls():
+    # Overridden by tests that need replica binds (DATABASE_REPLICA_URLS)
+    return ''
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, replica_urls):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "contacts.db"}')
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', replica_urls)
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        # Only the primary: replica binds get their schema from replication (see test_db_routing)
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(email='ada@example.com', password='secret'):
+        client.post('/api/register', json={'name': 'Ada', 'email': email, 'password': password})
+        response = client.post('/api/login', json={'email': email, 'password': password})
+        return {'Authorization': f"Bearer {response.json['access_token']}"}
+    return login
@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+from sqlalchemy import event, func, select
+
+from activity_log import ActivityWriter
+from models import ActivityDailyCount, ActivityLog, Users, db
+
+
+@pytest.fixture
+def user_id(client, login):
+    login()
+    return db.session.scalar(select(Users.id))
+
+
+@pytest.fixture
+def writer(app):
+    writer = ActivityWriter(app, mode='async', flush_interval=0.05)
+    yield writer
+    writer.stop()
+    event.remove(db.session, 'after_commit', writer._after_commit)
+    event.remove(db.session, 'after_soft_rollback', writer._after_rollback)
+
+
+def entry(user_id, contact_name='Grace'):
+    return {'user_id': user_id, 'timestamp': datetime.datetime.utcnow(),
+            'action': 'added', 'action_type': '', 'contact_name': contact_name}
+
+
+def logged_names():
+    return sorted(db.session.scalars(select(ActivityLog.contact_name)))
+
+
+def test_entries_are_written_once_the_session_commits(writer, user_id):
+    writer.record(user_id, 'added', '', 'Grace')
+    writer.record(user_id, 'added', '', 'Alan')
+    assert writer.queue.qsize() == 0
+
+    db.session.commit()
+    writer.stop()
+
+    assert logged_names() == ['Alan', 'Grace']
+    assert db.session.scalar(select(ActivityDailyCount.total)) == 2
+    assert writer.stats()['written'] == 2
+
+
+def test_rolled_back_entries_are_discarded(writer, user_id):
+    writer.record(user_id, 'added', '', 'Grace')
+    db.session.rollback()
+    writer.stop()
+
+    assert logged_names() == []
+
+
+def test_long_names_are_truncated_to_the_column(writer, user_id):
+    writer.record(user_id, 'added', 'x' * 80, 'G' * 100)
+    db.session.commit()
+    writer.stop()
+
+    assert logged_names() == ['G' * 50]
+
+
+def test_a_bad_entry_only_drops_itself(writer, user_id):
+    writer._write([entry(user_id, 'Grace'), entry('not-a-user-id'), entry(user_id, 'Alan')])
+
+    assert logged_names() == ['Alan', 'Grace']
+    assert writer.stats()['written'] == 2
+    assert writer.stats()['failed'] == 1
+
+
+def test_overflow_is_written_inline(app, user_id):
+    writer = ActivityWriter(app, mode='async', queue_size=1, put_timeout=0)
+    writer._ensure_started = lambda: None
+    try:
+        writer.record_many([entry(user_id, 'Grace'), entry(user_id, 'Alan'), entry(user_id, 'Edsger')])
+        db.session.commit()
+
+        assert writer.stats()['overflowed'] == 2
+        assert db.session.scalar(select(func.count()).select_from(ActivityLog)) == 2
+    finally:
+        event.remove(db.session, 'after_commit', writer._after_commit)
+        event.remove(db.session, 'after_soft_rollback', writer._after_rollback)
+
+
+def test_prune_deletes_old_rows_and_bumps_versions(app, user_id):
+    from app import prune_activities_command
+
+    now = datetime.datetime.utcnow()
+    db.session.add_all([
+        ActivityLog(user_id=user_id, timestamp=now - datetime.timedelta(days=91), action='added', action_type='', contact_name='Old'),
+        ActivityLog(user_id=user_id, timestamp=now - datetime.timedelta(hours=1), action='added', action_type='', contact_name='Recent'),
+    ])
+    db.session.commit()
+    version = db.session.scalar(select(Users.data_version).where(Users.id == user_id))
+
+    result = app.test_cli_runner().invoke(prune_activities_command, ['--days', '90', '--pause', '0'])
+    assert result.exit_code == 0, result.output
+    assert 'Recent' in logged_names() and 'Old' not in logged_names()
+    assert db.session.scalar(select(Users.data_version).where(Users.id == user_id)) == version + 1
+    assert all(timestamp.tzinfo is None for timestamp in db.session.scalars(select(ActivityLog.timestamp)))
@@ -0,0 +1,40 @@
+import uuid
+
+
+def create(client, headers, name):
+    return client.post('/api/contacts', json={'name': name, 'email': f'{name}@example.com'}, headers=headers).json['id']
+
+
+def test_batches_only_touch_the_callers_contacts(client, login):
+    owner = login('ada@example.com')
+    other = login('alan@example.com')
+    mine = [create(client, owner, name) for name in ('Grace', 'Edsger')]
+    theirs = create(client, other, 'Barbara')
+
+    response = client.post('/api/contacts/batch', json={
+        'ids': mine + [theirs, str(uuid.uuid4())], 'operation': 'set_status', 'status': 'blocked',
+    }, headers=owner)
+
+    assert response.status_code == 200
+    assert sorted(response.json['affected']) == sorted(mine)
+    assert client.get(f'/api/contacts/{theirs}', headers=other).json['status'] == 'active'
+    assert client.get('/api/contacts/stats', headers=owner).json['status']['blocked'] == 2
+
+    response = client.post('/api/contacts/batch', json={'ids': mine + [theirs], 'operation': 'delete'}, headers=owner)
+    assert response.json['count'] == 2
+    assert client.get('/api/contacts', headers=owner).json['contacts'] == []
+    assert client.get(f'/api/contacts/{theirs}', headers=other).status_code == 200
+
+
+def test_invalid_batches_change_nothing(client, login):
+    headers = login()
+    contact_id = create(client, headers, 'Grace')
+
+    for body in ({'ids': [contact_id, 'not-a-uuid'], 'operation': 'delete'},
+                 {'ids': [contact_id], 'operation': 'set_status', 'status': 'archived'},
+                 {'ids': [contact_id], 'operation': 'set_favorite', 'favorite': 'yes'},
+                 {'ids': [contact_id], 'operation': 'explode'}):
+        assert client.post('/api/contacts/batch', json=body, headers=headers).status_code == 400
+
+    contact = client.get(f'/api/contacts/{contact_id}', headers=headers).json
+    assert (contact['status'], contact['favorite']) == ('active', False)
@@ -0,0 +1,70 @@
+import datetime
+
+from sqlalchemy import select, update
+
+import app as app_module
+from models import Contacts, db
+
+
+def binned_contact(client, headers, name, days_ago=0):
+    contact_id = client.post('/api/contacts', json={'name': name, 'email': f'{name}@example.com'}, headers=headers).json['id']
+    client.patch(f'/api/contacts/{contact_id}/set-status', json={'status': 'bin'}, headers=headers)
+    if days_ago:
+        db.session.execute(update(Contacts).where(Contacts.name == name).values(
+            binned_at=datetime.datetime.utcnow() - datetime.timedelta(days=days_ago)
+        ))
+        db.session.commit()
+    return contact_id
+
+
+def binned_names(client, headers, **extra):
+    response = client.get('/api/contacts?status=bin', headers={**headers, **extra})
+    return response, sorted(contact['name'] for contact in response.json['contacts']) if response.status_code == 200 else None
+
+
+def test_expired_bin_entries_are_purged_and_cached_reads_move_on(app, client, login):
+    from app import purge_bin_command
+
+    headers = login()
+    expired = binned_contact(client, headers, 'Old', days_ago=31)
+    binned_contact(client, headers, 'Recent', days_ago=1)
+    response, names = binned_names(client, headers)
+    assert names == ['Old', 'Recent']
+
+    result = app.test_cli_runner().invoke(purge_bin_command, ['--days', '30', '--pause', '0'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Purged 1 contacts')
+
+    # The purge bumped the data version, so the old ETag no longer matches
+    response, names = binned_names(client, headers, **{'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert names == ['Recent']
+    assert client.get(f'/api/contacts/{expired}', headers=headers).status_code == 404
+
+
+def test_restored_contacts_leave_the_bin(client, login):
+    headers = login()
+    contact_id = binned_contact(client, headers, 'Grace', days_ago=40)
+    assert client.get('/api/contacts', headers=headers).json['contacts'] == []
+
+    client.patch(f'/api/contacts/{contact_id}/set-status', json={'status': 'active'}, headers=headers)
+
+    assert [contact['id'] for contact in client.get('/api/contacts', headers=headers).json['contacts']] == [contact_id]
+    assert binned_names(client, headers)[1] == []
+    assert db.session.scalar(select(Contacts.binned_at)) is None
+
+
+def test_emptying_the_bin_resumes_in_batches(client, login, monkeypatch):
+    monkeypatch.setattr(app_module, 'BIN_EMPTY_BATCH_SIZE', 2)
+    headers = login()
+    for name in ('Grace', 'Alan', 'Edsger'):
+        binned_contact(client, headers, name)
+
+    first = client.post('/api/contacts/bin/empty', headers=headers).json
+    assert (first['deleted'], first['has_more']) == (2, True)
+    # Contacts binned after the first call are not part of this emptying
+    binned_contact(client, headers, 'Barbara')
+
+    second = client.post('/api/contacts/bin/empty', query_string={'before': first['before']}, headers=headers).json
+    assert (second['deleted'], second['has_more']) == (1, False)
+    assert binned_names(client, headers)[1] == ['Barbara']
@@ -0,0 +1,45 @@
+import app as app_module
+from cache import FakeSharedClient, LRUCache, SharedCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a')
+    cache.set('c', b'3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(ttl=-1)
+    cache.set('a', b'1')
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_shared_cache_counts_hits_and_misses():
+    cache = SharedCache(FakeSharedClient())
+    cache.set('a', b'1')
+
+    assert cache.get('a') == b'1'
+    assert cache.get('b') is None
+    assert cache.stats() == {'backend': 'shared', 'hits': 1, 'misses': 1, 'evictions': None}
+
+
+def test_cached_reads_follow_the_data_version(client, login, monkeypatch):
+    cache = LRUCache()
+    monkeypatch.setattr(app_module, 'read_cache', cache)
+    headers = login()
+
+    assert client.get('/api/contacts', headers=headers).json['contacts'] == []
+    assert client.get('/api/contacts', headers=headers).json['contacts'] == []
+    assert cache.stats()['hits'] == 1
+
+    # The write bumps the version, so the cached empty page is no longer reachable
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers)
+    assert len(client.get('/api/contacts', headers=headers).json['contacts']) == 1
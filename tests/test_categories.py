@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'from': 'work'},
+    {'from': 'work', 'to': ''},
+    {'from': 'work', 'to': '   '},
+    {'from': 'work', 'to': 5},
+    {'from': ['work'], 'to': 'job'},
+    {'from': 'work', 'to': 'x' * 101},
+])
+def test_rename_rejects_invalid_names(client, login, body):
+    response = client.post('/api/categories/rename', json=body, headers=login())
+    assert response.status_code == 400
+
+
+def test_rename_merges_into_an_existing_category(client, login):
+    headers = login()
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com', 'categories': ['work', 'job']},
+                headers=headers)
+    client.post('/api/contacts', json={'name': 'Alan', 'email': 'a@example.com', 'categories': ['work']},
+                headers=headers)
+
+    response = client.post('/api/categories/rename', json={'from': 'work', 'to': 'job'}, headers=headers)
+    assert response.json['count'] == 2
+
+    contacts = client.get('/api/contacts', headers=headers).json['contacts']
+    assert sorted(c['categories'] for c in contacts) == [['job'], ['job']]
+    assert client.get('/api/categories', headers=headers).json == [{'name': 'job', 'count': 2}]
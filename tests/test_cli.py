@@ -0,0 +1,20 @@
+import click
+
+from app import create_app
+
+
+def test_serving_apps_skip_the_cli_setup(app):
+    assert 'migrate' not in app.extensions
+    assert 'prune-tombstones' not in app.cli.commands
+
+
+def test_maintenance_commands_are_registered_under_the_flask_command(app):
+    with click.Context(click.Command('flask')):
+        cli_app = create_app()
+    runner = cli_app.test_cli_runner()
+
+    result = runner.invoke(args=['prune-tombstones', '--days', '1'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Deleted 0 contact tombstones')
+
+    assert 'migrate' in cli_app.extensions
@@ -0,0 +1,47 @@
+import io
+
+from contact_io import read_rows
+
+CSV = 'name,email,phone,categories\nGrace Hopper,grace@example.com,+1 202 555 0100,work;navy\n"Alan, Turing",alan@example.com,,\n'
+VCARD = ('BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Ada Lo\r\n velace\r\nEMAIL:ada@example.com\r\n'
+         'CATEGORIES:math,work\r\nEND:VCARD\r\n')
+
+
+def test_rows_are_read_from_any_iterable_of_byte_lines():
+    # Python 3.10's SpooledTemporaryFile (an upload's stream) iterates lines but cannot be wrapped in TextIOWrapper
+    lines = iter(('﻿' + CSV).encode('utf-8').splitlines(keepends=True))
+
+    rows = list(read_rows(lines, 'csv'))
+    assert [row['name'] for row in rows] == ['Grace Hopper', 'Alan, Turing']
+    assert rows[0]['categories'] == 'work;navy'
+
+
+def test_file_uploads_are_imported(client, login):
+    headers = login()
+    for filename, body in (('contacts.csv', CSV), ('contacts.vcf', VCARD)):
+        response = client.post('/api/contacts/import', headers=headers,
+                               data={'file': (io.BytesIO(body.encode('utf-8')), filename)})
+        assert response.status_code == 200
+        assert response.json['errors'] == []
+
+    contacts = {contact['name']: contact for contact in client.get('/api/contacts', headers=headers).json['contacts']}
+    assert sorted(contacts) == ['Ada Lovelace', 'Alan, Turing', 'Grace Hopper']
+    assert contacts['Grace Hopper']['categories'] == ['work', 'navy']
+    assert contacts['Ada Lovelace']['categories'] == ['math', 'work']
+
+
+def test_exports_can_be_imported_again(client, login):
+    owner = login('ada@example.com')
+    client.post('/api/contacts/import?format=csv', data=CSV.encode('utf-8'), headers=owner, content_type='text/csv')
+
+    for format in ('csv', 'vcard'):
+        exported = client.get(f'/api/contacts/export?format={format}', headers=owner)
+        assert exported.status_code == 200
+        other = login(f'{format}@example.com')
+        imported = client.post(f'/api/contacts/import?format={format}', data=exported.data, headers=other)
+        assert imported.json == {'imported': 2, 'failed': 0, 'errors': []}
+        names = sorted(contact['name'] for contact in client.get('/api/contacts', headers=other).json['contacts'])
+        assert names == ['Alan, Turing', 'Grace Hopper']
+
+    lines = client.get('/api/contacts/export?format=ndjson', headers=owner).get_data(as_text=True).splitlines()
+    assert len(lines) == 2
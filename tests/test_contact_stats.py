@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from contact_stats import buckets
+
+
+def test_buckets_skip_categories_that_cannot_be_bucket_names():
+    contact = {'status': 'active', 'favorite': False, 'categories': ['work', 1, 'x' * 200]}
+    assert buckets(contact) == ['total', 'status:active', 'category:work']
+    assert buckets(dict(contact, categories='work')) == ['total', 'status:active']
+
+
+@pytest.mark.parametrize('categories', [[1], 'work', ['x' * 101], [''], ['work'] * 51])
+def test_invalid_categories_are_rejected(client, login, categories):
+    headers = login()
+    created = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com', 'categories': categories},
+                          headers=headers)
+    assert created.status_code == 400
+
+    contact_id = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers).json['id']
+    updated = client.put(f'/api/contacts/{contact_id}', json={'categories': categories}, headers=headers)
+    assert updated.status_code == 400
+
+
+def test_stats_follow_contact_writes(client, login):
+    headers = login()
+    contact_id = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com', 'categories': ['work']},
+                             headers=headers).json['id']
+    client.put(f'/api/contacts/{contact_id}', json={'categories': ['home'], 'favorite': True}, headers=headers)
+
+    stats = client.get('/api/contacts/stats', headers=headers).json
+    assert stats['total'] == 1
+    assert stats['favorite'] == 1
+    assert stats['categories'] == {'home': 1}
+
+
+def test_import_reports_rows_with_invalid_categories(client, login):
+    headers = login()
+    csv = 'name,email,categories\nGrace,g@example.com,work\nAlan,a@example.com,' + 'x' * 101 + '\n'
+    response = client.post('/api/contacts/import?format=csv', data=io.BytesIO(csv.encode()), headers=headers,
+                           content_type='text/csv')
+
+    assert response.json['imported'] == 1
+    assert response.json['errors'] == [{'row': 2, 'error': 'Categories must be at most 100 characters'}]
+    assert client.get('/api/contacts/stats', headers=headers).json['categories'] == {'work': 1}
+
+
+@pytest.mark.parametrize('status', ['categories', 'total', 'archived'])
+def test_unknown_statuses_are_rejected(client, login, status):
+    headers = login()
+    created = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com', 'status': status},
+                          headers=headers)
+    assert created.status_code == 400
+
+    contact_id = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers).json['id']
+    assert client.put(f'/api/contacts/{contact_id}', json={'status': status}, headers=headers).status_code == 400
+
+
+def test_statuses_are_nested_in_stats(client, login):
+    headers = login()
+    for status in ('active', 'bin'):
+        client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com', 'status': status,
+                                           'categories': ['work']}, headers=headers)
+
+    stats = client.get('/api/contacts/stats', headers=headers).json
+    assert stats['status'] == {'active': 1, 'blocked': 0, 'bin': 1}
+    assert stats['categories'] == {'work': 2}
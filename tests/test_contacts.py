@@ -0,0 +1,59 @@
+import datetime
+
+from sqlalchemy import update
+from werkzeug.http import http_date
+
+from models import Users, db
+
+
+def test_contact_routes_work_on_sqlite(client, login):
+    headers = login()
+
+    created = client.post('/api/contacts', json={'name': 'Grace', 'email': 'grace@example.com'}, headers=headers)
+    assert created.status_code == 201
+    contact_id = created.json['id']
+
+    assert [c['id'] for c in client.get('/api/contacts', headers=headers).json['contacts']] == [contact_id]
+    assert client.get(f'/api/contacts/{contact_id}', headers=headers).json['name'] == 'Grace'
+    assert client.put(f'/api/contacts/{contact_id}', json={'name': 'Grace H'}, headers=headers).status_code == 200
+    assert client.delete(f'/api/contacts/{contact_id}', headers=headers).status_code == 200
+    assert client.get(f'/api/contacts/{contact_id}', headers=headers).status_code == 404
+
+
+def test_contacts_are_scoped_to_their_owner(client, login):
+    owner = login('ada@example.com')
+    other = login('alan@example.com')
+    contact_id = client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=owner).json['id']
+
+    assert client.get(f'/api/contacts/{contact_id}', headers=other).status_code == 404
+    assert client.get('/api/contacts', headers=other).json['contacts'] == []
+
+
+def test_if_none_match_uses_weak_comparison(client, login):
+    headers = login()
+    etag = client.get('/api/contacts', headers=headers).headers['ETag']
+
+    # Proxies that compress the body weaken the validator they send back
+    response = client.get('/api/contacts', headers={**headers, 'If-None-Match': f'W/{etag}'})
+    assert response.status_code == 304
+
+
+def test_last_modified_is_only_sent_once_its_second_is_over(client, login):
+    headers = login()
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'grace@example.com'}, headers=headers)
+    set_updated_at(datetime.datetime.utcnow())
+
+    response = client.get('/api/contacts', headers=headers)
+    assert response.last_modified is None
+    # A second write within the same second must not be hidden behind an If-Modified-Since from before it
+    ims = {**headers, 'If-Modified-Since': http_date(datetime.datetime.now(datetime.timezone.utc))}
+    assert client.get('/api/contacts', headers=ims).status_code == 200
+
+    set_updated_at(datetime.datetime.utcnow() - datetime.timedelta(seconds=5))
+    last_modified = client.get('/api/contacts', headers=headers).headers['Last-Modified']
+    assert client.get('/api/contacts', headers={**headers, 'If-Modified-Since': last_modified}).status_code == 304
+
+
+def set_updated_at(value):
+    db.session.execute(update(Users).values(data_updated_at=value))
+    db.session.commit()
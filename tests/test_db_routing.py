@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import insert, select
+
+from db_routing import engine_options, pool_size_for, replica_binds
+from models import Contacts, Users, db
+
+
+@pytest.fixture
+def replica_urls(tmp_path):
+    return f'sqlite:///{tmp_path / "replica.db"}'
+
+
+def replicate():
+    # Stands in for streaming replication: copy the primary file over the replica
+    source = sqlite3.connect(db.engines[None].url.database)
+    target = sqlite3.connect(db.engines['replica_0'].url.database)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def add_replica_only_contact():
+    # A row only the replica has shows which database served a read
+    user_id = db.session.scalar(select(Users.id))
+    with db.engines['replica_0'].begin() as connection:
+        connection.execute(insert(Contacts).values(name='Replica only', email='r@example.com', user_id=user_id))
+
+
+def listed_names(client, headers):
+    return sorted(c['name'] for c in client.get('/api/contacts', headers=headers).json['contacts'])
+
+
+def test_reads_use_a_replica_that_has_caught_up(client, login):
+    headers = login()
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers)
+    replicate()
+    add_replica_only_contact()
+
+    assert listed_names(client, headers) == ['Grace', 'Replica only']
+
+
+def test_reads_stay_on_the_primary_while_the_replica_lags(client, login):
+    headers = login()
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers)
+    replicate()
+    add_replica_only_contact()
+    client.post('/api/contacts', json={'name': 'Alan', 'email': 'a@example.com'}, headers=headers)
+
+    assert listed_names(client, headers) == ['Alan', 'Grace']
+
+
+def test_reads_fall_back_to_the_primary_when_the_replica_is_unusable(client, login):
+    # The replica database has no tables at all
+    headers = login()
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'g@example.com'}, headers=headers)
+
+    assert listed_names(client, headers) == ['Grace']
+
+
+def test_engine_options():
+    assert replica_binds(' postgresql://r1/db, ,postgresql://r2/db') == {
+        'replica_0': 'postgresql://r1/db', 'replica_1': 'postgresql://r2/db'}
+    assert 'pool_size' not in engine_options('sqlite:///contacts.db')
+    assert engine_options('postgresql://h/db', statement_timeout=500)['connect_args'] == {
+        'options': '-c statement_timeout=500'}
+    assert pool_size_for(100, 8) == 12
@@ -0,0 +1,43 @@
+from duplicates import find_duplicate_groups
+
+
+def test_groups_use_the_lookup_keys():
+    rows = [
+        (1, 'Grace', 'Grace@Example.com ', None),
+        (2, 'G', 'grace@example.com', None),
+        (3, 'Alan', None, '020 7946 0000'),
+        (4, 'Al', None, '+1 020 7946 0000'),
+        (5, 'Edsger', None, '(202) 555-0100'),
+        (6, 'Ed', None, '+1 202 555 0100'),
+        (7, 'Barbara', 'barbara+work@example.com', '123'),
+        (8, 'Barb', 'barbara@example.com', '123'),
+    ]
+    groups = sorted((sorted(ids), reasons) for ids, reasons in find_duplicate_groups(rows))
+
+    assert groups == [([1, 2], ['email']), ([5, 6], ['phone'])]
+
+
+def test_duplicates_route_groups_by_name(client, login):
+    headers = login()
+    for email in ('grace@example.com', 'hopper@example.com'):
+        client.post('/api/contacts', json={'name': 'Grace Hopper', 'email': email}, headers=headers)
+
+    groups = client.get('/api/contacts/duplicates', headers=headers).json
+    assert [group['reasons'] for group in groups] == [['name']]
+    assert sorted(contact['email'] for contact in groups[0]['contacts']) == ['grace@example.com', 'hopper@example.com']
+
+
+def test_merges_cannot_exceed_the_category_limit(client, login):
+    headers = login()
+    ids = [client.post('/api/contacts', json={
+        'name': 'Grace Hopper', 'email': f'grace{n}@example.com', 'categories': [f'c{n}-{i}' for i in range(30)],
+    }, headers=headers).json['id'] for n in range(2)]
+
+    response = client.post('/api/contacts/merge', json={'keep': ids[0], 'merge': ids[1:]}, headers=headers)
+    assert response.status_code == 400
+    assert len(client.get('/api/contacts', headers=headers).json['contacts']) == 2
+
+    client.put(f'/api/contacts/{ids[1]}', json={'categories': ['c0-0', 'navy']}, headers=headers)
+    merged = client.post('/api/contacts/merge', json={'keep': ids[0], 'merge': ids[1:]}, headers=headers).json
+    assert merged['contact']['categories'] == [f'c0-{i}' for i in range(30)] + ['navy']
+    assert client.get('/api/contacts/stats', headers=headers).json['categories']['navy'] == 1
@@ -0,0 +1,183 @@
+import queue
+
+import pytest
+from sqlalchemy import event, select
+
+import app as app_module
+from events import EventBus, FakePubSubClient, LocalBackend, SharedBackend, TooManyStreams
+from models import Users, db
+
+
+def make_bus(app, backend, **options):
+    bus = EventBus(backend, **options)
+    bus.init_app(app)
+    return bus
+
+
+def listen(bus, add):
+    for name, listener in (('after_commit', bus._after_commit), ('after_soft_rollback', bus._after_rollback)):
+        (event.listen if add else event.remove)(db.session, name, listener)
+
+
+@pytest.fixture
+def buses(app):
+    # Pending events live on the session, so the app's own bus would take them first
+    listen(app_module.event_bus, False)
+    created = []
+    yield created
+    for bus in created:
+        listen(bus, False)
+    listen(app_module.event_bus, True)
+
+
+@pytest.fixture(params=['local', 'shared'])
+def bus(request, app, buses):
+    backend = LocalBackend() if request.param == 'local' else SharedBackend(FakePubSubClient())
+    bus = make_bus(app, backend, max_events_per_commit=3, max_queued=2)
+    buses.append(bus)
+    return bus
+
+
+def received(subscription):
+    # The shared backend delivers from its listener thread
+    frames = []
+    while True:
+        try:
+            frames.append(subscription.queue.get(timeout=0.2))
+        except queue.Empty:
+            return frames
+
+
+def event_names(frames):
+    return [line.split(': ', 1)[1] for frame in frames for line in frame.splitlines() if line.startswith('event: ')]
+
+
+def event_id(frame):
+    return frame.splitlines()[0].split(': ', 1)[1]
+
+
+def test_events_are_published_on_commit(bus):
+    subscription, missed = bus.subscribe('user')
+    bus.publish('user', 'activity', {'action': 'added'})
+    assert subscription.queue.empty()
+
+    db.session.commit()
+    assert event_names(received(subscription)) == ['activity']
+    assert missed == []
+    assert bus.stats()['published'] == 1
+
+
+def test_rolled_back_events_are_discarded(bus):
+    subscription, missed = bus.subscribe('user')
+    db.session.execute(select(Users.id))
+    bus.publish('user', 'activity', {'action': 'added'})
+    db.session.rollback()
+    db.session.commit()
+
+    assert received(subscription) == []
+
+
+def test_bulk_commits_collapse_into_one_resync(bus):
+    subscription, missed = bus.subscribe('user')
+    other, missed = bus.subscribe('other')
+    bus.publish_many('user', 'contact.updated', [{'id': n} for n in range(4)])
+    bus.publish('other', 'activity', {'action': 'added'})
+    db.session.commit()
+
+    frames = received(subscription)
+    assert event_names(frames) == ['resync']
+    assert '"reason":"bulk"' in frames[0]
+    assert event_names(received(other)) == ['activity']
+
+
+def test_reconnects_resume_after_their_last_event(bus):
+    subscription, missed = bus.subscribe('user')
+    for action in ('added', 'edited'):
+        bus.publish('user', 'activity', {'action': action})
+        db.session.commit()
+    first, second = received(subscription)
+    bus.unsubscribe(subscription)
+
+    subscription, missed = bus.subscribe('user', last_event_id=event_id(first))
+    assert missed == [second]
+    bus.unsubscribe(subscription)
+
+    subscription, missed = bus.subscribe('user', last_event_id='forgotten')
+    assert event_names(missed) == ['resync']
+    bus.unsubscribe(subscription)
+
+    # Resuming from the resync itself does not resync again
+    subscription, missed = bus.subscribe('user', last_event_id=event_id(missed[0]))
+    assert missed == []
+
+
+def test_streams_are_limited_per_user(bus):
+    for _ in range(bus.max_streams_per_user):
+        bus.subscribe('user')
+    with pytest.raises(TooManyStreams):
+        bus.subscribe('user')
+
+    bus.subscribe('other')
+    assert bus.stats()['streams'] == bus.max_streams_per_user + 1
+    assert bus.stats()['rejected'] == 1
+
+
+def test_a_stream_that_falls_behind_is_told_to_resync(app, buses):
+    bus = make_bus(app, LocalBackend(), max_queued=1)
+    buses.append(bus)
+    subscription, missed = bus.subscribe('user')
+    for action in ('added', 'edited'):
+        bus.publish('user', 'activity', {'action': action})
+    db.session.commit()
+
+    frames = list(bus.stream(subscription, missed, heartbeat=0.01, max_seconds=1))
+    assert frames[0] == 'retry: 3000\n\n'
+    assert event_names(frames[1:]) == ['activity', 'resync']
+    assert bus.stats()['streams'] == 0
+    assert bus.stats()['overflowed'] == 1
+
+
+def test_idle_streams_send_keep_alives_until_the_deadline(app, buses):
+    bus = make_bus(app, LocalBackend())
+    buses.append(bus)
+    subscription, missed = bus.subscribe('user')
+
+    frames = list(bus.stream(subscription, missed, heartbeat=0.01, max_seconds=0.05))
+    assert frames[0] == 'retry: 3000\n\n'
+    assert set(frames[1:]) == {': keep-alive\n\n'}
+    assert bus.stats()['streams'] == 0
+
+
+@pytest.fixture
+def route_bus(app, buses, monkeypatch):
+    bus = make_bus(app, LocalBackend(), max_streams_per_user=1)
+    buses.append(bus)
+    bus.backend.start(bus)
+    monkeypatch.setattr(app_module, 'event_bus', bus)
+    app.config.update(EVENTS_HEARTBEAT_SECONDS=0.01, EVENTS_MAX_STREAM_SECONDS=0.05)
+    return bus
+
+
+def test_events_route_replays_missed_changes(client, login, route_bus):
+    headers = login()
+    for name in ('Grace', 'Alan'):
+        client.post('/api/contacts', json={'name': name, 'email': f'{name}@example.com'}, headers=headers)
+    user_id = str(db.session.scalar(select(Users.id)))
+    (first, grace), (second, alan) = list(route_bus.histories[user_id])[:2]
+
+    response = client.get('/api/events', headers={**headers, 'Last-Event-ID': first}, buffered=False)
+    body = response.get_data(as_text=True)
+    response.close()
+
+    assert response.mimetype == 'text/event-stream'
+    assert alan in body and grace not in body
+    assert route_bus.stats()['streams'] == 0
+
+
+def test_events_route_rejects_streams_over_the_limit(client, login, route_bus):
+    headers = login()
+    route_bus.subscribe(db.session.scalar(select(Users.id)))
+
+    response = client.get('/api/events', headers=headers)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
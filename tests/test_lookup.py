@@ -0,0 +1,36 @@
+def lookup(client, headers, **body):
+    response = client.post('/api/contacts/lookup', json=body, headers=headers)
+    assert response.status_code == 200
+    return response.json
+
+
+def names(matches):
+    return [contact['name'] for contact in matches]
+
+
+def test_phones_and_emails_match_in_any_format(client, login):
+    headers = login()
+    grace = client.post('/api/contacts', json={'name': 'Grace', 'email': 'Grace@Example.com', 'phone': '(202) 555-0100'},
+                        headers=headers).json['id']
+    alan = client.post('/api/contacts', json={'name': 'Alan', 'email': 'alan@example.com'}, headers=headers).json['id']
+    client.put(f'/api/contacts/{alan}', json={'phone': '+44 20 7946 0000'}, headers=headers)
+
+    found = lookup(client, headers, phones=['+1 202 555 0100', '2025550100', '0044 20 7946 0000', '555'],
+                   emails=[' grace@example.COM'])
+    assert {value: names(matches) for value, matches in found['phones'].items()} == {
+        '+1 202 555 0100': ['Grace'], '2025550100': ['Grace'], '0044 20 7946 0000': ['Alan'], '555': [],
+    }
+    assert names(found['emails'][' grace@example.COM']) == ['Grace']
+
+    # Binned contacts are no longer anyone's caller ID
+    client.patch(f'/api/contacts/{grace}/set-status', json={'status': 'bin'}, headers=headers)
+    assert lookup(client, headers, phones=['2025550100'])['phones'] == {'2025550100': []}
+
+
+def test_lookups_are_scoped_to_the_caller(client, login):
+    owner = login('ada@example.com')
+    other = login('alan@example.com')
+    client.post('/api/contacts', json={'name': 'Grace', 'email': 'grace@example.com'}, headers=owner)
+
+    assert lookup(client, other, emails=['grace@example.com'])['emails'] == {'grace@example.com': []}
+    assert client.post('/api/contacts/lookup', json={'emails': 'grace@example.com'}, headers=owner).status_code == 400
@@ -0,0 +1,45 @@
+import pytest
+from flask import Flask
+
+import metrics
+from metrics import RequestMetrics
+
+
+@pytest.fixture
+def profiled_app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, PROFILE_SLOW_REQUESTS_MS=1)
+    request_metrics = RequestMetrics(app)
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    return app, request_metrics
+
+
+def test_a_failing_request_stops_its_profiler(profiled_app):
+    app, request_metrics = profiled_app
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/boom')
+
+    assert request_metrics.profiler.samples == {}
+    assert metrics._current.get() is None
+
+
+def test_completed_requests_are_rendered(profiled_app):
+    app, request_metrics = profiled_app
+    response = app.test_client().get('/ok')
+
+    assert 'Server-Timing' in response.headers
+    assert request_metrics.profiler.samples == {}
+    assert 'http_request_duration_seconds_count{method="GET",route="/ok",status="200"} 1' in request_metrics.render()
+
+
+def test_metrics_route_renders(client):
+    client.get('/')
+    assert 'route="/"' in client.get('/metrics').get_data(as_text=True)
@@ -0,0 +1,33 @@
+import datetime
+
+from sqlalchemy import update
+
+from models import Contacts, db
+
+
+def test_cursor_pages_through_contacts_created_at_the_same_instant(client, login):
+    headers = login()
+    ids = [client.post('/api/contacts', json={'name': f'Contact {n}', 'email': f'c{n}@example.com'},
+                       headers=headers).json['id'] for n in range(7)]
+    # Bulk imports stamp a whole batch with one created_at; only the id then orders the page boundary
+    db.session.execute(update(Contacts).values(created_at=datetime.datetime(2026, 1, 1)))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        page = client.get('/api/contacts', query_string={'limit': 3, 'fields': 'name', **({'cursor': cursor} if cursor else {})},
+                          headers=headers).json
+        assert len(page['contacts']) <= 3
+        seen += [contact['id'] for contact in page['contacts']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == sorted(ids)
+    assert len(set(seen)) == 7
+
+
+def test_invalid_cursors_are_rejected(client, login):
+    headers = login()
+    assert client.get('/api/contacts?cursor=not-a-cursor', headers=headers).status_code == 400
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+from flask import Flask
+
+from passwords import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture
+def hasher():
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=4, PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1,
+                      PASSWORD_HASH_TIMEOUT=10.0)
+    hasher = PasswordHasher(app)
+    yield hasher
+    if hasher.executor is not None:
+        hasher.executor.shutdown(cancel_futures=True)
+
+
+def test_hash_and_verify(hasher):
+    password_hash = hasher.hash('secret')
+
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'wrong')
+    assert not hasher.needs_rehash(password_hash)
+
+
+def test_a_broken_pool_is_replaced(hasher):
+    hasher.hash('secret')
+    broken = hasher.executor
+    for process in list(broken._processes.values()):
+        process.kill()
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('secret')
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    assert hasher.executor is not broken
+
+
+def test_timed_out_jobs_keep_their_slot_until_they_finish(hasher):
+    hasher._run(time.sleep, 0)
+    hasher.timeout = 0.05
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 0.5)
+    # Still running in the pool, so the only slot is taken
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 0)
+
+    time.sleep(0.8)
+    hasher.timeout = 10.0
+    hasher._run(time.sleep, 0)
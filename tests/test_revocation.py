@@ -0,0 +1,120 @@
+import datetime
+import time
+
+from sqlalchemy import insert
+
+from models import RevokedToken, db
+from revocation import BUCKET_SECONDS, BloomFilter, DatabaseRevocationBackend, MemoryRevocationBackend, RevocationStore
+
+
+def test_revocations_reach_other_workers_on_sync():
+    backend = MemoryRevocationBackend()
+    worker_a = RevocationStore(backend, sync_interval=0)
+    worker_b = RevocationStore(backend, sync_interval=0)
+
+    worker_a.revoke('jti-1', time.time() + 600)
+
+    assert worker_a.is_revoked('jti-1')
+    assert worker_b.is_revoked('jti-1')
+    assert not worker_b.is_revoked('jti-2')
+
+
+def test_sync_interval_bounds_how_often_the_backend_is_read():
+    backend = MemoryRevocationBackend()
+    worker_a = RevocationStore(backend, sync_interval=0)
+    worker_b = RevocationStore(backend, sync_interval=3600)
+    worker_b.is_revoked('jti-0')
+
+    worker_a.revoke('jti-1', time.time() + 600)
+
+    assert not worker_b.is_revoked('jti-1')
+
+
+def test_expired_revocations_are_swept_a_bucket_at_a_time():
+    store = RevocationStore(MemoryRevocationBackend(), sync_interval=0, bloom=True)
+    store.revoke('old', time.time() - 2 * BUCKET_SECONDS)
+    store.revoke('current', time.time() + 600)
+
+    assert not store.is_revoked('old')
+    assert 'old' not in store.expiry
+    assert store.is_revoked('current')
+    assert store.bloom.might_contain('current')
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=100)
+    for i in range(100):
+        bloom.add(f'jti-{i}')
+
+    assert all(bloom.might_contain(f'jti-{i}') for i in range(100))
+
+
+def test_database_backend_shares_revocations(app):
+    backend = DatabaseRevocationBackend()
+    worker_a = RevocationStore(backend, sync_interval=0)
+    worker_b = RevocationStore(backend, sync_interval=0)
+    assert not worker_b.is_revoked('jti-1')
+
+    worker_a.revoke('jti-1', time.time() + 600)
+
+    assert worker_b.is_revoked('jti-1')
+
+
+def test_logout_revokes_the_token(client, login):
+    headers = login()
+
+    assert client.get('/logout', headers=headers).status_code == 200
+    assert client.get('/api/contacts', headers=headers).status_code == 401
+
+
+def test_sweeping_never_exposes_an_empty_bloom_filter(monkeypatch):
+    store = RevocationStore(MemoryRevocationBackend(), sync_interval=0, bloom=True)
+    store.revoke('current', time.time() + 600)
+    store.revoke('old', time.time() - 2 * BUCKET_SECONDS)
+    seen = []
+    add = BloomFilter.add
+
+    def observe(bloom, value):
+        # What a concurrent is_revoked would read while the filter is being rebuilt
+        seen.append(store.bloom.might_contain('current'))
+        add(bloom, value)
+
+    monkeypatch.setattr(BloomFilter, 'add', observe)
+    store._sweep(time.time())
+
+    assert seen and all(seen)
+    assert store.is_revoked('current')
+
+
+def test_database_backend_picks_up_revocations_that_commit_out_of_order(app):
+    def revoked_elsewhere(id, jti):
+        db.session.execute(insert(RevokedToken).values(
+            id=id, jti=jti, expires_at=datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
+        ))
+        db.session.commit()
+
+    worker = RevocationStore(DatabaseRevocationBackend(), sync_interval=0)
+    revoked_elsewhere(1, 'jti-1')
+    assert worker.is_revoked('jti-1')
+
+    # Logout B took id 3 and committed first; logout A holds id 2 and commits afterwards
+    revoked_elsewhere(3, 'jti-3')
+    assert worker.is_revoked('jti-3')
+    revoked_elsewhere(2, 'jti-2')
+
+    assert worker.is_revoked('jti-2')
+    assert worker.cursor == (3, {})
+
+
+def test_memory_backend_prunes_expired_revocations():
+    backend = MemoryRevocationBackend()
+    worker = RevocationStore(backend, sync_interval=0)
+    backend.add('current', time.time() + 600)
+    backend.add('old', time.time() - 1)
+    assert worker.is_revoked('current')
+
+    assert backend.prune() == 1
+    backend.add('newer', time.time() + 600)
+
+    assert worker.is_revoked('newer')
+    assert [jti for sequence, jti, expires_at in backend.entries] == ['current', 'newer']
@@ -0,0 +1,47 @@
+import datetime
+import uuid
+
+import pytest
+
+import app as app_module
+from pagination import encode_cursor
+
+
+@pytest.fixture(autouse=True)
+def settled(monkeypatch):
+    # Nothing is in flight in these tests, so changes can be handed out as soon as they are made
+    monkeypatch.setattr(app_module, 'SYNC_SETTLE_SECONDS', 0)
+
+
+def sync(client, headers, since=None):
+    response = client.get('/api/contacts/sync', query_string={'since': since} if since else {}, headers=headers)
+    assert response.status_code == 200
+    return response.json
+
+
+def test_sync_reports_changes_and_deletions_since_the_cursor(client, login):
+    headers = login()
+    grace, alan = (client.post('/api/contacts', json={'name': name, 'email': f'{name}@example.com'}, headers=headers).json['id']
+                   for name in ('Grace', 'Alan'))
+
+    first = sync(client, headers)
+    assert sorted(contact['id'] for contact in first['contacts']) == sorted([grace, alan])
+    assert first['deleted'] == []
+
+    client.delete(f'/api/contacts/{grace}', headers=headers)
+    client.put(f'/api/contacts/{alan}', json={'name': 'Alan T'}, headers=headers)
+
+    delta = sync(client, headers, first['next_cursor'])
+    assert [contact['name'] for contact in delta['contacts']] == ['Alan T']
+    assert delta['deleted'] == [grace]
+    assert delta['has_more'] is False
+
+    caught_up = sync(client, headers, delta['next_cursor'])
+    assert (caught_up['contacts'], caught_up['deleted']) == ([], [])
+
+
+def test_cursors_older_than_the_tombstones_need_a_full_sync(client, login):
+    headers = login()
+    stale = encode_cursor(datetime.datetime.utcnow() - datetime.timedelta(days=app_module.SYNC_TOMBSTONE_DAYS + 1), uuid.UUID(int=0))
+
+    assert client.get('/api/contacts/sync', query_string={'since': stale}, headers=headers).status_code == 410